@@ -2,6 +2,7 @@ from dash import dcc, html, Input, Output, State
 import dash
 import pandas as pd
 import dash_bootstrap_components as dbc
+from flask_compress import Compress
 from pages import equipo, jugador, partido
 from dash.dependencies import Input, Output
 
@@ -21,6 +22,17 @@ login_layout = html.Div([
 ])
 
 app = dash.Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.BOOTSTRAP])
+jugador.register_callbacks(app)
+server = app.server
+
+# Compresión de respuestas (brotli si el cliente la acepta, si no gzip)
+server.config.update(
+    COMPRESS_ALGORITHM=['br', 'gzip'],
+    COMPRESS_BR_LEVEL=5,
+    COMPRESS_LEVEL=6,
+    COMPRESS_MIN_SIZE=500,
+)
+Compress(server)
 
 app.layout = html.Div([
    dcc.Location(id="url", refresh=False),
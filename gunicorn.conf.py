@@ -0,0 +1,17 @@
+# Configuración de gunicorn para producción: gunicorn -c gunicorn.conf.py wsgi:server
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+# Cargar la aplicación (datos, índices y precalentamiento) en el maestro antes del fork
+preload_app = True
+
+# Workers síncronos: pyplot no es seguro entre hilos
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+
+# utils/sql_engine.py reparte hilos y memoria de DuckDB entre los workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+
+# Los gráficos de matplotlib pueden tardar varios segundos
+timeout = 120
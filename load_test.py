@@ -0,0 +1,590 @@
+"""
+Prueba de carga de los callbacks de Dash.
+
+Lanza peticiones concurrentes contra /_dash-update-component y muestra
+rendimiento, latencias p50/p95/p99 y memoria de los workers.
+
+El modo de referencia es --url contra gunicorn (gunicorn -c gunicorn.conf.py
+wsgi:server), que es como se sirve la aplicación. Sin --url se usa el
+cliente de pruebas de Flask sobre app.server en el propio proceso: igual que
+los workers síncronos de gunicorn, cada usuario concurrente es un proceso
+hijo (fork) que envía sus peticiones en serie, porque pyplot no es seguro
+entre hilos.
+
+Los valores de las peticiones (equipos, temporadas, jugadores) se leen del
+mismo conjunto de datos que sirve la aplicación, así que todas recorren el
+camino completo. Sin el dataset real (git lfs pull), --synthetic-data genera
+uno sintético pequeño con la misma estructura, construye sus tablas
+derivadas y apunta la aplicación a él con DASHALAVES_DATA_DIR
+(utils/rutas.py).
+
+Ejemplos:
+    python load_test.py --url http://127.0.0.1:10000 --master-pid 1234 \
+        --mix equipo=3,temporadas=5,jugador=1,similares=2
+    python load_test.py --concurrency 4 --duration 60
+    python load_test.py --synthetic-data --concurrency 4 --requests 200
+
+    # Servidor y prueba sobre el mismo dataset sintético
+    python load_test.py --synthetic-data /tmp/sintetico --generate-only
+    DASHALAVES_DATA_DIR=/tmp/sintetico gunicorn -c gunicorn.conf.py wsgi:server
+    python load_test.py --synthetic-data /tmp/sintetico --url http://127.0.0.1:10000
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINT = '/_dash-update-component'
+
+# Los tamaños medidos son los de la respuesta tal como viaja (comprimida)
+ACCEPT_ENCODING = 'br, gzip'
+
+# Mezcla de peticiones por defecto (escenario=peso)
+MIX_DEFECTO = 'equipo=3,temporadas=5,jugador=1,similares=2'
+
+# Dataset sintético: temporadas (season_id, nombre) y tamaño
+TEMPORADAS_SINTETICAS = [(1, '2022/2023'), (2, '2023/2024')]
+EQUIPO_SINTETICO = 'Deportivo Alavés'
+RIVALES_SINTETICOS = 9
+JUGADORES_POR_EQUIPO = 18
+PARTIDOS_POR_TEMPORADA = 18
+EVENTOS_POR_PARTIDO = 150
+
+DEMARCACIONES_SINTETICAS = [
+    ('GK', 'Portero'), ('CB', 'Defensa Central'), ('LB', 'Lateral Izquierdo'), ('RB', 'Lateral Derecho'),
+    ('CM', 'Mediocentro'), ('AM', 'Mediapunta'), ('LW', 'Extremo Izquierdo'), ('ST', 'Delantero Centro'),
+]
+ESTADISTICAS_SINTETICAS = [
+    'goals', 'assists', 'shots', 'key_passes', 'passes', 'crosses', 'dribbles', 'tackles',
+    'interceptions', 'recoveries', 'aerial_duels_won', 'fouls', 'turnovers',
+]
+
+
+def _prop(id_, prop, value=None):
+    return {'id': id_, 'property': prop, 'value': value}
+
+
+def payload_equipo(datos):
+    """update_visualizations (pages/equipo.py)"""
+    team, season = random.choice(datos['equipos'])
+    return {
+        'output': '..visualizations-container.children...visualizations-state.data..',
+        'outputs': [
+            {'id': 'visualizations-container', 'property': 'children'},
+            {'id': 'visualizations-state', 'property': 'data'},
+        ],
+        'inputs': [_prop('generate-viz', 'n_clicks', random.randint(1, 50))],
+        'changedPropIds': ['generate-viz.n_clicks'],
+        'state': [
+            _prop('team-select', 'value', team),
+            _prop('season-select', 'value', season),
+            _prop('visualizations-state', 'data', None),
+        ],
+    }
+
+
+def payload_temporadas(datos):
+    """update_seasons (pages/equipo.py)"""
+    team, _ = random.choice(datos['equipos'])
+    return {
+        'output': 'season-select.options',
+        'outputs': {'id': 'season-select', 'property': 'options'},
+        'inputs': [_prop('team-select', 'value', team)],
+        'changedPropIds': ['team-select.value'],
+    }
+
+
+def payload_jugador(datos):
+    """generar_visualizacion (pages/jugador.py)"""
+    fila = random.choice(datos['jugadores'])
+    return {
+        'output': '..contenedor-graficas.children...contenedor-graficas-state.data..',
+        'outputs': [
+            {'id': 'contenedor-graficas', 'property': 'children'},
+            {'id': 'contenedor-graficas-state', 'property': 'data'},
+        ],
+        'inputs': [_prop('btn-generar', 'n_clicks', random.randint(1, 50))],
+        'changedPropIds': ['btn-generar.n_clicks'],
+        'state': [
+            _prop('grid-jugadores', 'selectedRows', [fila]),
+            _prop('contenedor-graficas-state', 'data', None),
+        ],
+    }
+
+
+def payload_similares(datos):
+    """mostrar_similares (pages/jugador.py)"""
+    fila = random.choice(datos['jugadores'])
+    season_id = random.choice(str(fila['season_id']).split(', '))
+    return {
+        'output': 'panel-similares.children',
+        'outputs': {'id': 'panel-similares', 'property': 'children'},
+        'inputs': [
+            _prop('similares-temporada', 'value', season_id),
+            _prop('similares-posicion', 'value', random.choice([['misma'], []])),
+        ],
+        'changedPropIds': ['similares-temporada.value'],
+        'state': [_prop('grid-jugadores', 'selectedRows', [fila])],
+    }
+
+
+ESCENARIOS = {
+    'equipo': payload_equipo,
+    'temporadas': payload_temporadas,
+    'jugador': payload_jugador,
+    'similares': payload_similares,
+}
+
+
+def parse_mix(texto):
+    """Convierte 'equipo=3,temporadas=5' en una lista de (escenario, peso)"""
+    mezcla = []
+    for parte in texto.split(','):
+        nombre, _, peso = parte.partition('=')
+        nombre = nombre.strip()
+        if nombre not in ESCENARIOS:
+            raise argparse.ArgumentTypeError(f"Escenario desconocido: {nombre} (opciones: {', '.join(ESCENARIOS)})")
+        mezcla.append((nombre, float(peso or 1)))
+    return mezcla
+
+
+def write_synthetic_dataset(carpeta, semilla=0):
+    """
+    Escribe en carpeta/archivos_parquet un conjunto de datos pequeño con la
+    estructura de los parquet que leen las páginas y las tablas derivadas.
+    Es determinista para una semilla dada.
+    """
+    import numpy as np
+    import pandas as pd
+    from utils.metricas import METRICAS_EVENTOS
+
+    rng = np.random.default_rng(semilla)
+    parquet_dir = os.path.join(carpeta, 'archivos_parquet')
+    os.makedirs(parquet_dir, exist_ok=True)
+
+    equipos = [EQUIPO_SINTETICO] + [f'Rival {i}' for i in range(1, RIVALES_SINTETICOS + 1)]
+    df_equipos = pd.DataFrame({'team_id': range(1, len(equipos) + 1), 'team_name': equipos})
+    df_jugadores = pd.DataFrame({
+        'player_id': range(1, len(equipos) * JUGADORES_POR_EQUIPO + 1),
+        'team_id': np.repeat(df_equipos['team_id'], JUGADORES_POR_EQUIPO).to_numpy(),
+        'demarcacion': [DEMARCACIONES_SINTETICAS[i % len(DEMARCACIONES_SINTETICAS)]
+                        for i in range(len(equipos) * JUGADORES_POR_EQUIPO)],
+    })
+    df_jugadores['player_name'] = [f'Jugador {pid}' for pid in df_jugadores['player_id']]
+
+    partidos, eventos, estadisticas, kpis = [], [], [], []
+    match_id = 0
+    for season_id, temporada in TEMPORADAS_SINTETICAS:
+        inicio = pd.Timestamp(f'{temporada[:4]}-08-15')
+        for jornada in range(1, PARTIDOS_POR_TEMPORADA + 1):
+            match_id += 1
+            rival = 2 + (jornada - 1) % RIVALES_SINTETICOS
+            partidos.append({'match_id': match_id, 'season_id': season_id,
+                             'match_date': inicio + pd.Timedelta(weeks=jornada - 1)})
+            for team_id in (1, rival):
+                plantilla = df_jugadores[df_jugadores['team_id'] == team_id]
+                n = EVENTOS_POR_PARTIDO
+                eventos.append(pd.DataFrame({
+                    'match_id': match_id, 'season_id': season_id, 'team_id': team_id,
+                    'player_id': rng.choice(plantilla['player_id'], n),
+                }))
+                for fila in plantilla.itertuples():
+                    minutos = int(rng.choice([0, 30, 60, 90], p=[0.2, 0.1, 0.2, 0.5]))
+                    if minutos:
+                        estadistica = {'player_id': fila.player_id, 'season_id': season_id, 'match_id': match_id,
+                                       'team_id': team_id, 'minutes_played': minutos,
+                                       'position': fila.demarcacion[0],
+                                       'pass_accuracy': float(rng.uniform(60, 95))}
+                        estadistica.update({col: int(rng.poisson(minutos / 30)) for col in ESTADISTICAS_SINTETICAS})
+                        estadisticas.append(estadistica)
+                kpis.append({'equipo': equipos[team_id - 1], 'temporada': temporada, 'jornada': jornada,
+                             'goles': int(rng.poisson(1.3)), 'tiros': int(rng.poisson(12)),
+                             'posesion': float(rng.uniform(35, 65))})
+
+    df_eventos = pd.concat(eventos, ignore_index=True)
+    df_eventos['event_id'] = range(1, len(df_eventos) + 1)
+    df_partidos = pd.DataFrame(partidos)
+
+    # Eventos con métricas del Alavés (eventos_metricas_alaves)
+    df_alaves = df_eventos[df_eventos['team_id'] == 1].merge(df_jugadores, on=['player_id', 'team_id'])
+    n = len(df_alaves)
+    df_alaves = df_alaves.assign(
+        temporada=df_alaves['season_id'].map(dict(TEMPORADAS_SINTETICAS)),
+        equipo=EQUIPO_SINTETICO,
+        jugador=df_alaves['player_name'],
+        demarcacion=df_alaves['demarcacion'].str[1],
+        tipo_evento=rng.choice(['Pase', 'Recuperación', 'Duelo', 'Tiro', 'Entrada'], n, p=[0.6, 0.1, 0.15, 0.05, 0.1]),
+        xstart=rng.uniform(0, 100, n), ystart=rng.uniform(0, 100, n),
+        xend=rng.uniform(0, 100, n), yend=rng.uniform(0, 100, n),
+        **{col: rng.binomial(1, 0.05, n) for col in METRICAS_EVENTOS},
+    ).drop(columns=['player_name'])
+
+    df_kpis = pd.DataFrame(kpis)
+    df_acumulados = df_kpis.drop(columns='posesion').sort_values(['equipo', 'temporada', 'jornada'])
+    df_acumulados[['goles', 'tiros']] = df_acumulados.groupby(['equipo', 'temporada'])[['goles', 'tiros']].cumsum()
+
+    tablas = {
+        'teams_league_all': df_equipos,
+        'names_players_league_all': df_jugadores[['player_id', 'player_name']],
+        'matches_league_all': df_partidos,
+        'events_league_all': df_eventos,
+        'eventos_metricas_alaves': df_alaves,
+        'player_stats_extended_league_all': pd.DataFrame(estadisticas),
+        'KPI_equipos': df_kpis,
+        'eventos_datos_acumulados': df_acumulados,
+    }
+    for nombre, df in tablas.items():
+        df.to_parquet(os.path.join(parquet_dir, f'{nombre}.parquet'), index=False)
+    return parquet_dir
+
+
+def prepare_synthetic_data(carpeta=None, semilla=0):
+    """
+    Prepara el dataset sintético (parquet y tablas derivadas) y apunta la
+    aplicación a él. Debe llamarse antes de importar app o utils.
+    """
+    carpeta = carpeta or tempfile.mkdtemp(prefix='dashalaves_')
+    os.environ['DASHALAVES_DATA_DIR'] = carpeta
+    if not os.path.exists(os.path.join(carpeta, 'derivados')):
+        write_synthetic_dataset(carpeta, semilla)
+        from utils import ingest
+        ingest.run_ingest()
+    print(f"Dataset sintético en {carpeta}")
+    return carpeta
+
+
+def request_values(parquet_dir):
+    """
+    Valores para las peticiones (equipo/temporada y filas del grid de
+    jugadores), leídos del conjunto de datos que sirve la aplicación para
+    que ninguna petición caiga en un camino vacío o de error.
+    """
+    import pandas as pd
+
+    ruta = os.path.join(parquet_dir, 'eventos_metricas_alaves.parquet')
+    try:
+        df = pd.read_parquet(ruta, columns=['equipo', 'temporada', 'jugador', 'player_id', 'demarcacion', 'season_id'])
+    except Exception as e:
+        raise SystemExit(f"No se pudo leer {ruta} ({e}); descargue los datos (git lfs pull) o use --synthetic-data")
+
+    # Mismos filtros que pages/equipo.py (FILTER_DATA) y pages/jugador.py (df_agrupado)
+    df_equipos = df[df['equipo'].astype(str).str.contains('Alavés', na=False)]
+    df_jugadores = df[df['equipo'].str.contains('Alav', case=False, na=False)]
+    jugadores = df_jugadores.groupby(['jugador', 'equipo', 'player_id']).agg({
+        'temporada': lambda x: ', '.join(sorted(x.astype(str).unique())),
+        'demarcacion': lambda x: ', '.join(sorted(x.unique())),
+        'season_id': lambda x: ', '.join(sorted(x.astype(str).unique()))
+    }).reset_index()
+
+    datos = {
+        'equipos': sorted(set(zip(df_equipos['equipo'].astype(str), df_equipos['temporada'].astype(str)))),
+        'jugadores': json.loads(jugadores.to_json(orient='records')),
+    }
+    if not datos['equipos'] or not datos['jugadores']:
+        raise SystemExit(f"{ruta} no tiene equipos o jugadores del Alavés")
+    return datos
+
+
+class InProcessClient:
+    """Cliente de pruebas de Flask sobre app.server (uno por proceso)"""
+
+    def __init__(self, server, accept_encoding=ACCEPT_ENCODING):
+        self.server = server
+        self.accept_encoding = accept_encoding
+        self.local = threading.local()
+
+    def post(self, payload):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.server.test_client()
+        respuesta = self.local.client.post(ENDPOINT, json=payload, headers={'Accept-Encoding': self.accept_encoding})
+        return respuesta.status_code, len(respuesta.get_data())
+
+
+class HttpClient:
+    """Cliente HTTP contra una instancia local"""
+
+    def __init__(self, url, accept_encoding=ACCEPT_ENCODING):
+        self.url = url.rstrip('/') + ENDPOINT
+        self.accept_encoding = accept_encoding
+
+    def post(self, payload):
+        peticion = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Accept-Encoding': self.accept_encoding},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(peticion, timeout=120) as respuesta:
+                return respuesta.status, len(respuesta.read())
+        except urllib.error.HTTPError as e:
+            return e.code, 0
+
+
+def _rss_kb(pid):
+    """Memoria residente actual y pico (VmRSS/VmHWM, en kB) de un proceso"""
+    valores = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for linea in f:
+                if linea.startswith(('VmRSS:', 'VmHWM:')):
+                    clave, valor = linea.split(':', 1)
+                    valores[clave] = int(valor.split()[0])
+    except OSError:
+        pass
+    return valores.get('VmRSS'), valores.get('VmHWM')
+
+
+def _child_pids(pid):
+    """Procesos hijo (workers) de un proceso maestro"""
+    hijos = []
+    try:
+        for tarea in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{tarea}/children') as f:
+                hijos.extend(int(p) for p in f.read().split())
+    except OSError:
+        pass
+    return hijos
+
+
+class MemorySampler(threading.Thread):
+    """Muestrea periódicamente la memoria de los procesos observados"""
+
+    def __init__(self, pids, master_pid=None, intervalo=0.5):
+        super().__init__(daemon=True)
+        self.pids = set(pids)
+        self.master_pid = master_pid
+        self.intervalo = intervalo
+        self.pico = {}
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.is_set():
+            self.sample()
+            self.parar.wait(self.intervalo)
+
+    def sample(self):
+        if self.master_pid is not None:
+            self.pids.update(_child_pids(self.master_pid))
+        for pid in list(self.pids):
+            rss, _ = _rss_kb(pid)
+            if rss is not None:
+                self.pico[pid] = max(self.pico.get(pid, 0), rss)
+
+    def report(self):
+        self.sample()
+        memoria = {}
+        for pid in sorted(self.pids):
+            rss, hwm = _rss_kb(pid)
+            memoria[pid] = {'rss_kb': rss, 'rss_pico_kb': self.pico.get(pid), 'hwm_kb': hwm}
+        return memoria
+
+
+def percentile(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return None
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+def _send_requests(cliente, datos, mezcla, siguiente, fin, warmup):
+    """Bucle de un usuario: envía peticiones en serie hasta que 'siguiente' devuelve None o se acaba el tiempo"""
+    nombres = [nombre for nombre, _ in mezcla]
+    pesos = [peso for _, peso in mezcla]
+    muestras = []
+    while fin is None or time.monotonic() < fin:
+        numero = siguiente()
+        if numero is None:
+            break
+        escenario = random.choices(nombres, weights=pesos)[0]
+        payload = ESCENARIOS[escenario](datos)
+        inicio = time.perf_counter()
+        try:
+            estado, tamano = cliente.post(payload)
+        except Exception as e:
+            print(f"Error en petición {escenario}: {e}")
+            estado, tamano = 0, 0
+        latencia = time.perf_counter() - inicio
+        if numero > warmup:
+            muestras.append((escenario, latencia, estado, tamano))
+    return muestras
+
+
+def _next_request(contador, lock, limite):
+    """Reserva el número de la siguiente petición, o None si se alcanzó el límite"""
+    with lock:
+        if limite is not None and contador.value >= limite:
+            return None
+        contador.value += 1
+        return contador.value
+
+
+class _Counter:
+    """Contador de peticiones compartido entre hilos (entre procesos se usa multiprocessing.Value)"""
+
+    def __init__(self):
+        self.value = 0
+
+
+def _process_user(cliente, datos, mezcla, contador, fin, warmup, limite, semilla, cola):
+    """Proceso hijo de un usuario; siempre deja sus muestras en la cola para que el padre no se bloquee"""
+    random.seed(semilla)
+    muestras = []
+    try:
+        muestras = _send_requests(cliente, datos, mezcla, lambda: _next_request(contador, contador.get_lock(), limite),
+                                  fin, warmup)
+    except Exception as e:
+        print(f"Error en el proceso {os.getpid()}: {e}")
+    finally:
+        cola.put(muestras)
+
+
+def run_load_test(cliente, datos, mezcla, concurrencia, duracion=None, peticiones=None, warmup=0, procesos=False):
+    """
+    Ejecuta la prueba y devuelve las muestras (escenario, latencia_s, estado, bytes).
+
+    Se para al alcanzar 'peticiones' o tras 'duracion' segundos, lo que
+    ocurra antes. Las primeras 'warmup' peticiones no se cuentan.
+
+    Con procesos=True cada usuario es un proceso hijo (fork) que envía sus
+    peticiones en serie (modo en proceso); si no, un hilo (modo --url, donde
+    los hilos sólo esperan la respuesta HTTP).
+    """
+    fin = time.monotonic() + duracion if duracion else None
+    limite = peticiones + warmup if peticiones is not None else None
+
+    if not procesos:
+        contador, lock = _Counter(), threading.Lock()
+        siguiente = lambda: _next_request(contador, lock, limite)
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            futuros = [pool.submit(_send_requests, cliente, datos, mezcla, siguiente, fin, warmup)
+                       for _ in range(concurrencia)]
+            return [muestra for futuro in futuros for muestra in futuro.result()]
+
+    contexto = multiprocessing.get_context('fork')
+    contador = contexto.Value('i', 0)
+    cola = contexto.Queue()
+    hijos = [
+        contexto.Process(target=_process_user,
+                         args=(cliente, datos, mezcla, contador, fin, warmup, limite, random.random(), cola))
+        for _ in range(concurrencia)
+    ]
+    for hijo in hijos:
+        hijo.start()
+    # Leer la cola antes de join(): un hijo no termina hasta vaciar su parte
+    muestras = [muestra for _ in hijos for muestra in cola.get()]
+    for hijo in hijos:
+        hijo.join()
+    return muestras
+
+
+def summarize(muestras, segundos):
+    """Resumen por escenario y total"""
+    resumen = {}
+    grupos = {'TOTAL': muestras}
+    for muestra in muestras:
+        grupos.setdefault(muestra[0], []).append(muestra)
+
+    for nombre, grupo in grupos.items():
+        latencias = sorted(m[1] for m in grupo)
+        resumen[nombre] = {
+            'peticiones': len(grupo),
+            'errores': sum(1 for m in grupo if m[2] != 200),
+            'rps': len(grupo) / segundos if segundos else 0.0,
+            'p50_ms': (percentile(latencias, 50) or 0) * 1000,
+            'p95_ms': (percentile(latencias, 95) or 0) * 1000,
+            'p99_ms': (percentile(latencias, 99) or 0) * 1000,
+            'bytes_medios': sum(m[3] for m in grupo) / len(grupo) if grupo else 0,
+        }
+    return resumen
+
+
+def print_report(resumen, memoria):
+    print(f"\n{'Escenario':<12}{'Peticiones':>11}{'Errores':>9}{'req/s':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'KB medios':>11}")
+    for nombre, r in resumen.items():
+        print(f"{nombre:<12}{r['peticiones']:>11}{r['errores']:>9}{r['rps']:>9.2f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['bytes_medios'] / 1024:>11.1f}")
+
+    if memoria:
+        print(f"\n{'PID':<10}{'RSS MB':>10}{'Pico MB':>10}")
+        for pid, m in memoria.items():
+            rss = (m['rss_kb'] or 0) / 1024
+            pico = (m['rss_pico_kb'] or 0) / 1024
+            print(f"{pid:<10}{rss:>10.1f}{pico:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de los callbacks de Dash')
+    parser.add_argument('--url', help='Instancia local (p. ej. http://127.0.0.1:10000); sin --url se usa app.server en proceso')
+    parser.add_argument('--concurrency', type=int, default=20, help='Usuarios concurrentes (procesos sin --url)')
+    parser.add_argument('--duration', type=float, default=30, help='Duración máxima en segundos')
+    parser.add_argument('--requests', type=int, help='Número total de peticiones')
+    parser.add_argument('--warmup', type=int, default=0, help='Peticiones iniciales que no se cuentan')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(MIX_DEFECTO), help=f'Mezcla escenario=peso (por defecto {MIX_DEFECTO})')
+    parser.add_argument('--synthetic-data', nargs='?', const='', metavar='CARPETA',
+                        help='Generar (o reutilizar) un dataset sintético y servirlo/leerlo en lugar de data/')
+    parser.add_argument('--generate-only', action='store_true', help='Sólo preparar el dataset sintético')
+    parser.add_argument('--pids', type=int, nargs='*', default=[], help='PIDs de workers a observar')
+    parser.add_argument('--master-pid', type=int, help='PID del proceso maestro; se observan sus hijos')
+    parser.add_argument('--accept-encoding', default=ACCEPT_ENCODING, help="Cabecera Accept-Encoding ('identity' para medir sin compresión)")
+    parser.add_argument('--seed', type=int, help='Semilla para reproducir la secuencia de peticiones')
+    parser.add_argument('--json', help='Guardar el resumen en este archivo JSON')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # Antes de importar utils o app: utils/rutas.py lee DASHALAVES_DATA_DIR al importarse
+    if args.synthetic_data is not None:
+        prepare_synthetic_data(args.synthetic_data or None)
+        if args.generate_only:
+            return 0
+    from utils.rutas import PARQUET_DIR
+    datos = request_values(PARQUET_DIR)
+
+    if args.url:
+        cliente = HttpClient(args.url, args.accept_encoding)
+        pids = args.pids
+    else:
+        import app as app_module
+        cliente = InProcessClient(app_module.app.server, args.accept_encoding)
+        pids = args.pids or [os.getpid()]
+    # En proceso, los usuarios son hijos de este proceso
+    master_pid = args.master_pid if args.url or args.master_pid else os.getpid()
+    muestreo = MemorySampler(pids, master_pid)
+    muestreo.start()
+
+    inicio = time.monotonic()
+    muestras = run_load_test(cliente, datos, args.mix, args.concurrency,
+                             duracion=args.duration, peticiones=args.requests, warmup=args.warmup,
+                             procesos=not args.url)
+    segundos = time.monotonic() - inicio
+
+    muestreo.parar.set()
+    muestreo.join()
+    memoria = muestreo.report()
+    resumen = summarize(muestras, segundos)
+    print_report(resumen, memoria)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k != 'mix'},
+                       'mix': args.mix, 'segundos': segundos,
+                       'resumen': resumen, 'memoria': memoria}, f, indent=2)
+
+    return 1 if resumen['TOTAL']['errores'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,9 @@
 # Importaciones de bibliotecas estándar
 import sys
 import os
-from pathlib import Path
 import traceback
 import io
+from functools import lru_cache
 
 # Importaciones de terceros
 from dash import Dash, html, dcc, callback
@@ -27,6 +27,13 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import landscape, letter
 from PIL import Image
 
+from utils import sql_engine
+from utils.metricas import METRICAS_EVENTOS
+from utils.team_shape import load_team_shapes
+from utils.kpi_series import load_kpi_series, SUFIJO_MOVIL, VENTANA
+from utils.panels import build_panel_update, fig_to_base64, panel_hash
+from utils.rutas import PARQUET_DIR
+
 # Configuración de colores y estilos
 BACKGROUND_COLOR = '#f8f9fa'
 PRIMARY_COLOR = '#007bff'
@@ -34,24 +41,23 @@ TEXT_COLOR = '#000000'
 HIGHLIGHT_COLOR = '#4BB3FD'
 LINE_COLOR = '#007bff'
 
+# Combinaciones equipo/temporada cuyas imágenes se mantienen en memoria
+RENDER_CACHE_SIZE = 32
+
+# KPIs que se muestran en la evolución por jornada
+MAX_KPIS_GRAFICO = 4
+
 # Clase para manejar la carga y gestión de datos
 class DataManager:
+    COLUMNS = [
+        'event_id', 'season_id', 'temporada', 'equipo', 'jugador', 'tipo_evento',
+        'xstart', 'ystart', 'xend', 'yend',
+    ] + METRICAS_EVENTOS
+
     @staticmethod
     def load_parquet_data(file_path):
         try:
-            columns = [
-                'event_id', 'season_id', 'temporada', 'equipo', 'jugador', 'tipo_evento',
-                'xstart', 'ystart', 'xend', 'yend',
-                'duelos_aereos_ganados_zona_area', 'duelos_aereos_ganados_zona_baja', 
-                'duelos_aereos_ganados_zona_media', 'duelos_aereos_ganados_zona_alta',
-                'recuperaciones_zona_baja', 'recuperaciones_zona_media', 'recuperaciones_zona_alta',
-                'entradas_ganadas_zona_area', 'entradas_ganadas_zona_baja', 
-                'entradas_ganadas_zona_media', 'entradas_ganadas_zona_alta',
-                'pases_largos_exitosos', 'cambios_orientacion_exitosos',
-                'pases_adelante_inicio', 'pases_adelante_creacion',
-                'pases_horizontal_inicio', 'pases_horizontal_creacion'
-            ]
-            df = pd.read_parquet(file_path, engine='fastparquet', columns=columns)
+            df = pd.read_parquet(file_path, engine='fastparquet', columns=DataManager.COLUMNS)
             df = df.astype({
                 'equipo': 'category',
                 'temporada': 'category',
@@ -73,26 +79,101 @@ class DataManager:
         
         return df_filtros
 
+    @staticmethod
+    def get_filter_data_sql():
+        """Obtiene datos de filtro con DuckDB, sin cargar el parquet en memoria"""
+        return DataManager.query(
+            "SELECT DISTINCT equipo, temporada FROM eventos_metricas_alaves "
+            "WHERE equipo LIKE ?",
+            ['%Alavés%']
+        )
+
+    @staticmethod
+    def query(sql, params=None):
+        """
+        Consulta SQL parametrizada sobre las vistas de data/archivos_parquet
+        (events_league_all, matches_league_all, teams_league_all, ...).
+        Devuelve None si DuckDB no está disponible o la consulta falla.
+        """
+        if not sql_engine.is_available():
+            return None
+        try:
+            return sql_engine.query(sql, params)
+        except Exception as e:
+            print(f"Error en consulta SQL: {e}")
+            return None
+
+    @staticmethod
+    def get_seasons(df, team):
+        """Temporadas de un equipo"""
+        if df is None:
+            df_sql = DataManager.query(
+                "SELECT DISTINCT temporada FROM eventos_metricas_alaves WHERE equipo = ? ORDER BY temporada",
+                [team]
+            )
+            return [] if df_sql is None else df_sql['temporada'].tolist()
+        return sorted(df[df['equipo'] == team]['temporada'].unique())
+
     @staticmethod
     def filter_data(df, team, season):
         """Filtra datos por equipo y temporada"""
+        if df is None:
+            # Sin datos en memoria el filtro y la selección de columnas se
+            # hacen sobre el parquet (sólo se leen los row groups necesarios)
+            columnas = ', '.join(f'"{col}"' for col in DataManager.COLUMNS)
+            return DataManager.query(
+                f"SELECT {columnas} FROM eventos_metricas_alaves WHERE equipo = ? AND temporada = ?",
+                [team, season]
+            )
+
         df_filtered = df[
             (df['equipo'] == team) & 
             (df['temporada'] == season)
         ]
         return df_filtered
 
+    @staticmethod
+    def get_team_matches(team, season):
+        """
+        Partidos de un equipo en una temporada con su número de eventos.
+        
+        El join events_league_all ↔ matches_league_all ↔ teams_league_all se
+        resuelve en DuckDB (fuera de memoria si hace falta); sólo vuelve a
+        pandas el resultado agregado.
+        """
+        return DataManager.query(
+            """
+            SELECT m.match_id, m.match_date, COUNT(*) AS eventos
+            FROM events_league_all e
+            JOIN matches_league_all m ON m.match_id = e.match_id
+            JOIN teams_league_all t ON t.team_id = e.team_id
+            WHERE t.team_name = ?
+              AND m.season_id IN (
+                  SELECT DISTINCT season_id FROM eventos_metricas_alaves
+                  WHERE equipo = ? AND temporada = ?
+              )
+            GROUP BY m.match_id, m.match_date
+            ORDER BY m.match_date
+            """,
+            [team, team, season]
+        )
+
 # Cargar datos globales
-BASE_DIR = Path(__file__).parent.parent
-PARQUET_PATH = os.path.join(BASE_DIR, "data", "archivos_parquet", "eventos_metricas_alaves.parquet")
+PARQUET_PATH = os.path.join(PARQUET_DIR, "eventos_metricas_alaves.parquet")
 
-try:
-    GLOBAL_DATA = DataManager.load_parquet_data(PARQUET_PATH)
-    FILTER_DATA = DataManager.get_filter_data(GLOBAL_DATA)
-except Exception as e:
-    print(f"Error cargando datos globales: {e}")
-    GLOBAL_DATA = None
-    FILTER_DATA = None
+# Con DuckDB los filtros se consultan sobre el parquet y no se materializa
+# GLOBAL_DATA; sin él (o si falla) se carga el parquet en memoria como antes
+GLOBAL_DATA = None
+FILTER_DATA = DataManager.get_filter_data_sql()
+
+if FILTER_DATA is None:
+    try:
+        GLOBAL_DATA = DataManager.load_parquet_data(PARQUET_PATH)
+        FILTER_DATA = DataManager.get_filter_data(GLOBAL_DATA)
+    except Exception as e:
+        print(f"Error cargando datos globales: {e}")
+        GLOBAL_DATA = None
+        FILTER_DATA = None
 
 # Funciones de visualización
 def create_team_advanced_metrics(df_combined, team_name, season_ids):
@@ -293,6 +374,74 @@ def create_team_heatmap(df_equipos, team_name, season_ids):
     ax.set_title(f'Mapa de Calor - {team_name}', color=TEXT_COLOR)
     return fig
 
+def create_team_shape_trend(team_name, season_ids):
+    """Crea la evolución por partido del área (mediana por ventanas) de la envolvente convexa del equipo"""
+    fig, ax = plt.subplots(figsize=(12, 5), facecolor=BACKGROUND_COLOR)
+    ax.set_facecolor(BACKGROUND_COLOR)
+    
+    # La forma se lee de la tabla derivada (utils/team_shape.py), no se calcula aquí
+    df_forma = load_team_shapes(team_name, season_ids)
+    
+    if df_forma.empty:
+        ax.text(0.5, 0.5, 'Sin datos de forma del equipo', color=TEXT_COLOR,
+                ha='center', va='center', transform=ax.transAxes)
+        ax.set_axis_off()
+        return fig
+    
+    colores_fase = {'Total': PRIMARY_COLOR, 'Ataque': '#50C878', 'Defensa': '#FF6B6B'}
+    # Orden cronológico por fecha del partido (match_id sólo desempata o suple la fecha)
+    partidos = (
+        df_forma.drop_duplicates('match_id')
+        .sort_values(['fecha', 'match_id'] if 'fecha' in df_forma.columns else ['match_id'])['match_id']
+    )
+    orden = {match_id: i + 1 for i, match_id in enumerate(partidos)}
+    
+    for fase, df_fase in df_forma.groupby('fase'):
+        df_fase = df_fase.assign(partido=df_fase['match_id'].map(orden)).sort_values('partido')
+        ax.plot(df_fase['partido'], df_fase['area'], marker='o',
+                color=colores_fase.get(fase, HIGHLIGHT_COLOR), label=fase)
+    
+    ax.set_xlabel('Partido', color=TEXT_COLOR)
+    ax.set_ylabel('Área (m²)', color=TEXT_COLOR)
+    ax.set_title(f'Forma del Equipo - {team_name}', color=TEXT_COLOR)
+    ax.tick_params(colors=TEXT_COLOR)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.legend()
+    
+    return fig
+
+def create_team_kpi_series(team_name, season):
+    """Crea la evolución por jornada de los KPIs del equipo con su media móvil"""
+    # Las series se leen de la tabla derivada (utils/kpi_series.py), no se calculan aquí
+    df_series = load_kpi_series(team_name, season)
+    kpis = [col[:-len(SUFIJO_MOVIL)] for col in df_series.columns if col.endswith(SUFIJO_MOVIL)][:MAX_KPIS_GRAFICO]
+    
+    if df_series.empty or not kpis:
+        fig, ax = plt.subplots(figsize=(12, 4), facecolor=BACKGROUND_COLOR)
+        ax.text(0.5, 0.5, 'Sin KPIs para esta temporada', color=TEXT_COLOR,
+                ha='center', va='center', transform=ax.transAxes)
+        ax.set_axis_off()
+        return fig
+    
+    fig, axes = plt.subplots(len(kpis), 1, figsize=(12, 3 * len(kpis)), facecolor=BACKGROUND_COLOR, sharex=True, squeeze=False)
+    
+    for ax, kpi in zip(axes[:, 0], kpis):
+        ax.set_facecolor(BACKGROUND_COLOR)
+        ax.bar(df_series['jornada'], df_series[kpi], color=HIGHLIGHT_COLOR, alpha=0.4, label='Jornada')
+        ax.plot(df_series['jornada'], df_series[f'{kpi}{SUFIJO_MOVIL}'], color=PRIMARY_COLOR,
+                marker='o', label=f'Últimos {VENTANA}')
+        ax.set_ylabel(kpi.replace('_', ' '), color=TEXT_COLOR)
+        ax.tick_params(colors=TEXT_COLOR)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+    
+    axes[0, 0].legend()
+    axes[-1, 0].set_xlabel('Jornada', color=TEXT_COLOR)
+    axes[0, 0].set_title(f'Evolución de KPIs - {team_name}', color=TEXT_COLOR)
+    
+    return fig
+
 def create_lineup_visualization(df_lineups, team_name):
     """Crea la visualización de alineaciones"""
     pitch = Pitch(pitch_type='wyscout', pitch_color=BACKGROUND_COLOR, line_color=PRIMARY_COLOR)
@@ -378,7 +527,10 @@ layout = dbc.Container([
         ], className="mb-4"),
         
         # Contenedor para visualizaciones
-        html.Div(id='visualizations-container', className='row')
+        html.Div(id='visualizations-container', className='row'),
+        
+        # Huellas de los paneles mostrados, para enviar sólo los que cambian
+        dcc.Store(id='visualizations-state')
     ], fluid=True)
 ], style={'backgroundColor': BACKGROUND_COLOR})
 
@@ -390,7 +542,7 @@ layout = dbc.Container([
     Input('generate-viz', 'id')
 )
 def init_teams(_):
-    if GLOBAL_DATA is None or FILTER_DATA is None:
+    if FILTER_DATA is None:
         return [], None, "Error: No se pudieron cargar los datos"
     
     try:
@@ -406,80 +558,98 @@ def init_teams(_):
     Input('team-select', 'value')
 )
 def update_seasons(team):
-    if not team or GLOBAL_DATA is None:
+    if not team or FILTER_DATA is None:
         return []
     
     try:
-        temporadas = sorted(GLOBAL_DATA[GLOBAL_DATA['equipo'] == team]['temporada'].unique())
+        temporadas = DataManager.get_seasons(GLOBAL_DATA, team)
         return [{'label': temporada, 'value': temporada} for temporada in temporadas]
     except Exception as e:
         print(f"Error en update_seasons: {e}")
         return []
 
 @callback(
-    Output('visualizations-container', 'children'),
+    Output('matches-info', 'children'),
+    Input('season-select', 'value'),
+    State('team-select', 'value')
+)
+def update_matches_info(season, team):
+    if not team or not season:
+        return ""
+    
+    df_partidos = DataManager.get_team_matches(team, season)
+    if df_partidos is None:
+        return ""
+    return [
+        html.H5("Partidos"),
+        html.P(f"{len(df_partidos)} partidos · {int(df_partidos['eventos'].sum())} eventos")
+    ]
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_team_figures(team, season):
+    """
+    Genera las imágenes de la página para un equipo y temporada.
+    
+    Devuelve una tupla de (título, imagen base64, ancho de columna). El
+    resultado se cachea por proceso; la entrada WSGI lo precalienta en el
+    proceso maestro para que los workers lo hereden al hacer fork. La caché
+    no se invalida tras una ingesta: hay que reiniciar el servidor.
+    """
+    # Filtrar datos
+    df_detailed = DataManager.filter_data(GLOBAL_DATA, team, season)
+    
+    # Obtener season_ids
+    season_ids = df_detailed['season_id'].unique().tolist()
+    
+    # Generar visualizaciones
+    metrics_fig = create_team_advanced_metrics(df_detailed, team, season_ids)  # Pasar team y season_ids
+    pass_flow_fig = create_team_pass_flow_map(df_detailed, team, season_ids)
+    heatmap_fig = create_team_heatmap(df_detailed, team, season_ids)
+    shape_fig = create_team_shape_trend(team, season_ids)
+    kpi_fig = create_team_kpi_series(team, season)
+    
+    return (
+        ("Métricas del Equipo", fig_to_base64(metrics_fig), 6),
+        ("Mapa de Flujo de Pases", fig_to_base64(pass_flow_fig), 6),
+        ("Mapa de Calor", fig_to_base64(heatmap_fig), 12),
+        ("Forma del Equipo", fig_to_base64(shape_fig), 12),
+        ("Evolución de KPIs", fig_to_base64(kpi_fig), 12),
+    )
+
+@callback(
+    [Output('visualizations-container', 'children'),
+     Output('visualizations-state', 'data')],
     Input('generate-viz', 'n_clicks'),
     [State('team-select', 'value'),
-     State('season-select', 'value')]
+     State('season-select', 'value'),
+     State('visualizations-state', 'data')]
 )
-def update_visualizations(n_clicks, team, season):
+def update_visualizations(n_clicks, team, season, hashes_previos):
     if not n_clicks or not team or not season:
-        return []
+        return [], None
     
     try:
-        # Filtrar datos
-        df_detailed = DataManager.filter_data(GLOBAL_DATA, team, season)
-        
-        # Obtener season_ids
-        season_ids = df_detailed['season_id'].unique().tolist()
-        
-        # Generar visualizaciones
-        metrics_fig = create_team_advanced_metrics(df_detailed, team, season_ids)  # Pasar team y season_ids
-        pass_flow_fig = create_team_pass_flow_map(df_detailed, team, season_ids)
-        heatmap_fig = create_team_heatmap(df_detailed, team, season_ids)
-        
-        # Convertir figuras de matplotlib a imágenes base64
-        from io import BytesIO
-        import base64
-        
-        def fig_to_base64(fig):
-            buf = BytesIO()
-            fig.savefig(buf, format='png', bbox_inches='tight')
-            plt.close(fig)  # Cerrar la figura después de guardarla
-            buf.seek(0)
-            return base64.b64encode(buf.getvalue()).decode('utf-8')
-        
+        paneles = render_team_figures(team, season)
         visualizations = [
             dbc.Col([
-                html.H4("Métricas del Equipo", className="text-center"),
-                html.Img(
-                    src=f'data:image/png;base64,{fig_to_base64(metrics_fig)}',
-                    className='img-fluid'
-                )
-            ], width=6),
-            dbc.Col([
-                html.H4("Mapa de Flujo de Pases", className="text-center"),
-                html.Img(
-                    src=f'data:image/png;base64,{fig_to_base64(pass_flow_fig)}',
-                    className='img-fluid'
-                )
-            ], width=6),
-            dbc.Col([
-                html.H4("Mapa de Calor", className="text-center"),
+                html.H4(titulo, className="text-center"),
                 html.Img(
-                    src=f'data:image/png;base64,{fig_to_base64(heatmap_fig)}',
+                    src=f'data:image/png;base64,{imagen}',
                     className='img-fluid'
                 )
-            ], width=12)
+            ], width=ancho)
+            for titulo, imagen, ancho in paneles
         ]
+        hashes = [panel_hash(*panel) for panel in paneles]
         
-        return visualizations
+        # Al cambiar sólo la temporada se envían únicamente los paneles distintos
+        return build_panel_update(visualizations, hashes, hashes_previos)
     
     except Exception as e:
         print(f"Error en update_visualizations: {e}")
         import traceback
         traceback.print_exc()
-        return [html.Div(f"Error: {e}", className="alert alert-danger")]
+        return [html.Div(f"Error: {e}", className="alert alert-danger")], None
 
 # Ejecutar la aplicación
 if __name__ == '__main__':
@@ -5,16 +5,43 @@ import pandas as pd
 import pyarrow.parquet as pq
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
+from matplotlib.colors import LinearSegmentedColormap
 from mplsoccer import Pitch
 import numpy as np
+from scipy.ndimage import gaussian_filter
+from utils.metricas import METRICAS_EVENTOS
+from utils.percentiles import get_player_profile
+from utils.rutas import PARQUET_DIR
+from utils.similarity import get_similar_players
+from utils.panels import build_panel_update, fig_to_base64, panel_hash
 
 # Constants and data loading (same as before)
 BACKGROUND_COLOR = '#0E1117'
 HIGHLIGHT_COLOR = '#4BB3FD'
 LINE_COLOR = '#FFFFFF'
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PARQUET_PATH = os.path.join(BASE_DIR, 'data', 'archivos_parquet', 'eventos_metricas_alaves.parquet')
+# Métricas del gráfico de pizza, en orden (columnas de player_stats_extended_league_all)
+METRICAS_PIZZA = [
+    ('goals', 'Goles'),
+    ('assists', 'Asistencias'),
+    ('shots', 'Tiros'),
+    ('key_passes', 'Pases clave'),
+    ('passes', 'Pases'),
+    ('pass_accuracy', 'Precisión de pase'),
+    ('crosses', 'Centros'),
+    ('dribbles', 'Regates'),
+    ('tackles', 'Entradas'),
+    ('interceptions', 'Intercepciones'),
+    ('recoveries', 'Recuperaciones'),
+    ('aerial_duels_won', 'Duelos aéreos ganados'),
+    ('fouls', 'Faltas'),
+    ('turnovers', 'Pérdidas'),
+]
+
+# Número de jugadores en el panel de similares
+NUM_SIMILARES = 10
+
+PARQUET_PATH = os.path.join(PARQUET_DIR, 'eventos_metricas_alaves.parquet')
 
 df_jugadores = pq.read_table(PARQUET_PATH).to_pandas()
 df_jugadores = df_jugadores[df_jugadores['equipo'].str.contains('Alav', case=False, na=False)]
@@ -23,6 +50,7 @@ df_agrupado = df_jugadores.groupby(['jugador', 'equipo', 'player_id']).agg({
     'demarcacion': lambda x: ', '.join(sorted(x.unique())),
     'season_id': lambda x: ', '.join(sorted(x.astype(str).unique()))
 }).reset_index()
+NOMBRES_TEMPORADA = dict(zip(df_jugadores['season_id'].astype(str), df_jugadores['temporada'].astype(str)))
 
 # Column definitions and default column definitions (same as before)
 columnDefs = [
@@ -43,39 +71,215 @@ defaultColDef = {
     "floatingFilter": False
 }
 
+def create_pizza_chart(ax, df, player_id, season_ids):
+    """
+    Gráfico de pizza con los percentiles de liga del jugador.
+
+    Los percentiles salen de la tabla precalculada (utils/percentiles.py), por
+    lo que no se recorren las estadísticas de la liga en cada petición. Con
+    varias temporadas se muestra la media de percentiles. El eje debe ser polar.
+    """
+    perfiles = [get_player_profile(player_id, season_id) for season_id in season_ids]
+    perfiles = [p for p in perfiles if p is not None]
+
+    ax.set_facecolor(BACKGROUND_COLOR)
+    if not perfiles:
+        ax.set_axis_off()
+        ax.text(0.5, 0.5, 'Sin percentiles de liga para este jugador',
+                color=LINE_COLOR, ha='center', va='center', transform=ax.transAxes)
+        return
+
+    # Percentiles ya invertidos en las métricas donde menos es mejor (faltas, pérdidas)
+    media = pd.DataFrame([p['percentiles'] for p in perfiles]).mean()
+    metricas = [(col, nombre) for col, nombre in METRICAS_PIZZA if pd.notna(media.get(col))]
+    if not metricas:
+        ax.set_axis_off()
+        ax.text(0.5, 0.5, 'Sin métricas de pizza para este jugador',
+                color=LINE_COLOR, ha='center', va='center', transform=ax.transAxes)
+        return
+    percentiles = pd.Series([media[col] for col, _ in metricas], index=[nombre for _, nombre in metricas])
+
+    angulos = np.linspace(0, 2 * np.pi, len(percentiles), endpoint=False)
+    ancho = 2 * np.pi / len(percentiles)
+    ax.bar(angulos, percentiles.values, width=ancho * 0.95, color=HIGHLIGHT_COLOR,
+           edgecolor=BACKGROUND_COLOR, alpha=0.85)
+
+    for angulo, valor in zip(angulos, percentiles.values):
+        ax.text(angulo, valor + 6, f'{valor:.0f}', color=LINE_COLOR, ha='center', va='center', fontsize=9)
+
+    ax.set_ylim(0, 100)
+    ax.set_xticks(angulos)
+    ax.set_xticklabels(percentiles.index, color=LINE_COLOR, fontsize=8)
+    ax.set_yticklabels([])
+    ax.grid(color=LINE_COLOR, alpha=0.2)
+    ax.spines['polar'].set_visible(False)
+    ax.set_title(f"Percentiles vs {perfiles[0]['grupo_posicion']} de la liga", color=LINE_COLOR, pad=20)
+
+def _player_events(df, player_id, season_ids):
+    """Eventos del jugador en las temporadas dadas (ids comparados como texto)"""
+    return df[
+        (df['player_id'].astype(str) == str(player_id)) &
+        (df['season_id'].astype(str).isin([str(s) for s in season_ids]))
+    ].copy()
+
+def create_pass_flow_map(ax, df, player_id, season_ids, pitch):
+    """Mapa de flujo de los pases del jugador (dirección media por zona de inicio)"""
+    df_pases = _player_events(df, player_id, season_ids)
+    df_pases = df_pases[df_pases['tipo_evento'] == 'Pase']
+    for col in ['xstart', 'ystart', 'xend', 'yend']:
+        df_pases[col] = pd.to_numeric(df_pases[col], errors='coerce')
+    df_pases = df_pases.dropna(subset=['xstart', 'ystart', 'xend', 'yend'])
+
+    pitch.draw(ax=ax)
+    if df_pases.empty:
+        ax.set_title('Sin pases registrados', color=LINE_COLOR)
+        return
+
+    bins = (6, 4)
+    cmap = LinearSegmentedColormap.from_list('custom', [BACKGROUND_COLOR, HIGHLIGHT_COLOR])
+    heatmap = pitch.bin_statistic(df_pases['ystart'], df_pases['xstart'], statistic='count', bins=bins)
+    pitch.heatmap(heatmap, ax=ax, cmap=cmap, alpha=0.6)
+    pitch.flow(df_pases['ystart'], df_pases['xstart'], df_pases['yend'], df_pases['xend'],
+               color=LINE_COLOR, arrow_type='scale', arrow_length=15, bins=bins, ax=ax, zorder=2, alpha=0.6)
+    ax.set_title(f'{len(df_pases)} pases', color=LINE_COLOR)
+
+def create_heatmap(ax, df, player_id, season_ids, pitch):
+    """Mapa de calor de las acciones del jugador"""
+    df_acciones = _player_events(df, player_id, season_ids)
+    for col in ['xstart', 'ystart']:
+        df_acciones[col] = pd.to_numeric(df_acciones[col], errors='coerce')
+    df_acciones = df_acciones.dropna(subset=['xstart', 'ystart'])
+
+    pitch.draw(ax=ax)
+    if df_acciones.empty:
+        ax.set_title('Sin acciones registradas', color=LINE_COLOR)
+        return
+
+    bin_statistic = pitch.bin_statistic(df_acciones['ystart'], df_acciones['xstart'], statistic='count', bins=(20, 20))
+    bin_statistic['statistic'] = gaussian_filter(bin_statistic['statistic'], 1)
+    cmap = LinearSegmentedColormap.from_list('custom', [BACKGROUND_COLOR, HIGHLIGHT_COLOR])
+    pitch.heatmap(bin_statistic, ax=ax, cmap=cmap, edgecolors=BACKGROUND_COLOR)
+    ax.set_title(f'{len(df_acciones)} acciones', color=LINE_COLOR)
+
+def plot_player_metrics(ax, df, player_id, season_ids):
+    """Barras con el total de las métricas de eventos del jugador, agrupadas por tipo"""
+    df_jugador = _player_events(df, player_id, season_ids)
+    grupos = [
+        ('Duelos Aéreos Ganados', 'duelos_aereos_ganados_'),
+        ('Recuperaciones', 'recuperaciones_'),
+        ('Entradas Ganadas', 'entradas_ganadas_'),
+        ('Pases Largos Exitosos', ('pases_largos_exitosos', 'cambios_orientacion_exitosos')),
+        ('Pases Adelante', 'pases_adelante_'),
+        ('Pases Horizontales', 'pases_horizontal_'),
+    ]
+
+    nombres, valores = [], []
+    for nombre, prefijo in grupos:
+        columnas = [col for col in METRICAS_EVENTOS if col.startswith(prefijo) and col in df_jugador.columns]
+        total = df_jugador[columnas].apply(pd.to_numeric, errors='coerce').sum().sum() if columnas else 0
+        nombres.append(nombre)
+        valores.append(total)
+
+    ax.set_facecolor(BACKGROUND_COLOR)
+    y_pos = range(len(nombres))
+    ax.barh(y_pos, valores, align='center', color=HIGHLIGHT_COLOR)
+    ax.set_yticks(list(y_pos))
+    ax.set_yticklabels(nombres, color=LINE_COLOR)
+    ax.invert_yaxis()
+    ax.set_xlabel('Número de Acciones', color=LINE_COLOR)
+    ax.tick_params(colors=LINE_COLOR)
+    for lado in ['top', 'right']:
+        ax.spines[lado].set_visible(False)
+    for lado in ['left', 'bottom']:
+        ax.spines[lado].set_color(LINE_COLOR)
+    for i, v in enumerate(valores):
+        ax.text(v, i, f' {v:.0f}', color=LINE_COLOR, va='center')
+
+def render_player_panels(player_id, season_ids):
+    """
+    Genera cada gráfico del jugador como un panel independiente.
+    
+    Devuelve una lista de (título, imagen base64 o None, ancho en %, error).
+    Un gráfico que falla no impide mostrar el resto.
+    """
+    # Coordenadas de eventos_metricas_alaves en escala 0-100, como en la página de equipo
+    pitch = Pitch(pitch_type='wyscout', pitch_color=BACKGROUND_COLOR, line_color='white')
+    graficos = [
+        ('Percentiles de Liga', True, 50, lambda ax: create_pizza_chart(ax, df_jugadores, player_id, season_ids)),
+        ('Métricas del Jugador', False, 50, lambda ax: plot_player_metrics(ax, df_jugadores, player_id, season_ids)),
+        ('Mapa de Flujo de Pases', False, 50, lambda ax: create_pass_flow_map(ax, df_jugadores, player_id, season_ids, pitch)),
+        ('Mapa de Calor', False, 50, lambda ax: create_heatmap(ax, df_jugadores, player_id, season_ids, pitch)),
+    ]
+    
+    paneles = []
+    for titulo, polar, ancho, dibujar in graficos:
+        fig = plt.figure(figsize=(10 * ancho / 50, 6), facecolor=BACKGROUND_COLOR)
+        ax = fig.add_subplot(111, projection='polar' if polar else None)
+        try:
+            dibujar(ax)
+            paneles.append((titulo, fig_to_base64(fig), ancho, None))
+        except Exception as e:
+            plt.close(fig)
+            print(f"Error creando {titulo}: {e}")
+            paneles.append((titulo, None, ancho, str(e)))
+    return paneles
+
 # Layout for the Dash app
 layout = html.Div([
     html.H1('Análisis de Jugadores del Alavés', style={'textAlign': 'center', 'marginBottom': '20px'}),
     
-    # AG Grid
-    dag.AgGrid(
-        id="grid-jugadores",
-        rowData=df_agrupado.to_dict('records'),
-        columnDefs=columnDefs,
-        defaultColDef=defaultColDef,
-        enableEnterpriseModules=True,
-        dashGridOptions={
-            "sideBar": {
-                "toolPanels": [
-                    {
-                        "id": "filters",
-                        "labelDefault": "Filtros",
-                        "labelKey": "filters",
-                        "iconKey": "filter",
-                        "toolPanel": "agFiltersToolPanel",
-                    }
-                ],
-                "defaultToolPanel": "filters"
+    html.Div([
+        # AG Grid
+        html.Div(dag.AgGrid(
+            id="grid-jugadores",
+            rowData=df_agrupado.to_dict('records'),
+            columnDefs=columnDefs,
+            defaultColDef=defaultColDef,
+            enableEnterpriseModules=True,
+            dashGridOptions={
+                "sideBar": {
+                    "toolPanels": [
+                        {
+                            "id": "filters",
+                            "labelDefault": "Filtros",
+                            "labelKey": "filters",
+                            "iconKey": "filter",
+                            "toolPanel": "agFiltersToolPanel",
+                        }
+                    ],
+                    "defaultToolPanel": "filters"
+                },
+                "rowSelection": "single",
+                "pagination": True,
+                "paginationAutoPageSize": True,
+                "suppressRowClickSelection": True,
+                "rowHeight": 50,
             },
-            "rowSelection": "single",
-            "pagination": True,
-            "paginationAutoPageSize": True,
-            "suppressRowClickSelection": True,
-            "rowHeight": 50,
-        },
-        className="ag-theme-alpine",
-        style={"height": 400}
-    ),
+            className="ag-theme-alpine",
+            style={"height": 400}
+        ), style={'flex': '2'}),
+
+        # Similar players panel
+        html.Div([
+            html.H4('Jugadores similares'),
+            dcc.Dropdown(id='similares-temporada', placeholder='Temporada', clearable=False),
+            dcc.Checklist(
+                id='similares-posicion',
+                options=[
+                {'label': ' Misma posición', 'value': 'misma'},
+                {'label': ' Sólo Alavés', 'value': 'alaves'}
+            ],
+                value=['misma'],
+                style={'marginTop': '10px'}
+            ),
+            html.Div(id='panel-similares', style={'marginTop': '10px', 'overflowY': 'auto', 'maxHeight': '280px'})
+        ], style={
+            'flex': '1',
+            'padding': '15px',
+            'backgroundColor': '#f8f9fa',
+            'borderRadius': '5px'
+        })
+    ], style={'display': 'flex', 'gap': '20px'}),
     
     # Button to generate visualization
     html.Button('Generar Visualización', id='btn-generar', n_clicks=0, style={
@@ -98,7 +302,10 @@ layout = html.Div([
     }),
     
     # Graphs container
-    html.Div(id='contenedor-graficas', style={'marginTop': '20px'})
+    html.Div(id='contenedor-graficas', style={'marginTop': '20px', 'display': 'flex', 'flexWrap': 'wrap'}),
+    
+    # Fingerprints of the panels shown, so only changed ones are sent
+    dcc.Store(id='contenedor-graficas-state')
 ])
 
 def register_callbacks(app):
@@ -121,63 +328,77 @@ def register_callbacks(app):
         return info, {'display': 'block'}
 
     @app.callback(
-    Output('contenedor-graficas', 'children'),
-    [Input('btn-generar', 'n_clicks')],
-    [State('grid-jugadores', 'selectedRows')]
-)
-    def generar_visualizacion(n_clicks, selected_rows):
+        [Output('similares-temporada', 'options'),
+         Output('similares-temporada', 'value')],
+        [Input('grid-jugadores', 'selectedRows')]
+    )
+    def actualizar_temporadas_similares(selected_rows):
+        if not selected_rows:
+            return [], None
+
+        season_ids = selected_rows[0]['season_id'].split(', ')
+        options = [{'label': NOMBRES_TEMPORADA.get(s, s), 'value': s} for s in season_ids]
+        return options, season_ids[-1]
+
+    @app.callback(
+        Output('panel-similares', 'children'),
+        [Input('similares-temporada', 'value'),
+         Input('similares-posicion', 'value')],
+        [State('grid-jugadores', 'selectedRows')]
+    )
+    def mostrar_similares(season_id, posicion, selected_rows):
+        if not selected_rows or season_id is None:
+            return html.P('Selecciona un jugador')
+
+        # Consulta sobre el índice precalculado (utils/similarity.py)
+        similares = get_similar_players(
+            selected_rows[0]['player_id'],
+            season_id,
+            k=NUM_SIMILARES,
+            same_position='misma' in (posicion or []),
+            only_alaves='alaves' in (posicion or [])
+        )
+        if not similares:
+            return html.P('Sin datos de similitud para este jugador')
+
+        return html.Ol([
+            html.Li(f"{s['jugador']} (distancia {s['distancia']:.2f})")
+            for s in similares
+        ])
+
+    @app.callback(
+        [Output('contenedor-graficas', 'children'),
+         Output('contenedor-graficas-state', 'data')],
+        [Input('btn-generar', 'n_clicks')],
+        [State('grid-jugadores', 'selectedRows'),
+         State('contenedor-graficas-state', 'data')]
+    )
+    def generar_visualizacion(n_clicks, selected_rows, hashes_previos):
         if n_clicks == 0 or not selected_rows:
-            return []
-    
-        print("Selected Rows:", selected_rows)  # Depuración
-        jugador = selected_rows[0]
-        print("Jugador seleccionado:", jugador)  # Depuración
+            return [], None
         
         jugador = selected_rows[0]
         player_id = jugador['player_id']
         season_ids = [int(s) for s in jugador['season_id'].split(', ')]  # Convertir a lista de enteros
         
-        # Crear figura con subplots
-        fig = plt.figure(figsize=(20, 24), facecolor=BACKGROUND_COLOR)
-        gs = gridspec.GridSpec(4, 2, figure=fig)
-        
         try:
-            # 1. Pizza Chart
-            ax1 = fig.add_subplot(gs[0, 0])
-            create_pizza_chart(ax1, df_jugadores, player_id, season_ids)
-            
-            # 2. KPI Evolution
-            ax2 = fig.add_subplot(gs[0, 1])
-            create_kpi_evolution_chart(ax2, df_jugadores, player_id, season_ids)
-            
-            # 3. Pass Flow Map
-            ax3 = fig.add_subplot(gs[1, 0])
-            pitch = Pitch(pitch_type='statsbomb', pitch_color=BACKGROUND_COLOR, line_color='white')
-            create_pass_flow_map_vertical(ax3, df_jugadores, player_id, season_ids, pitch)
-            
-            # 4. Heatmap
-            ax4 = fig.add_subplot(gs[1, 1])
-            create_heatmap(ax4, df_jugadores, player_id, season_ids, pitch)
-            
-            # 5. Combined Passes
-            ax5 = fig.add_subplot(gs[2, :])
-            draw_combined_passes(ax5, df_jugadores, player_id, season_ids, pitch)
-            
-            # 6. Player Metrics
-            ax6 = fig.add_subplot(gs[3, :])
-            plot_player_metrics_modern(ax6, df_jugadores, player_id, season_ids)
-            
-            plt.tight_layout()
-            
-            # Convertir la figura a un componente de Dash
-            return dcc.Graph(
-                figure=fig,
-                style={'height': '2000px'}
-            )
-            
+            paneles = render_player_panels(player_id, season_ids)
         except Exception as e:
             print(f"Error creando gráficos: {e}")
-            return html.Div(f"Error creando gráficos: {str(e)}")
+            return [html.Div(f"Error creando gráficos: {str(e)}")], None
+        
+        componentes = [
+            html.Div([
+                html.H4(titulo, style={'textAlign': 'center'}),
+                html.Img(src=f'data:image/png;base64,{imagen}', style={'width': '100%'})
+                if imagen else html.P(f'Error creando gráfico: {error}', style={'color': 'red'})
+            ], style={'width': f'{ancho}%'})
+            for titulo, imagen, ancho, error in paneles
+        ]
+        hashes = [panel_hash(*panel) for panel in paneles]
+        
+        # Only the panels that differ from what the client already shows are sent
+        return build_panel_update(componentes, hashes, hashes_previos)
 
 
 
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import kpi_series  # noqa: E402
+from utils.kpi_series import CLAVES, append_matchdays, compute_rolling, load_matchday_kpis  # noqa: E402
+
+
+def _jornadas(equipos=('Alavés', 'Osasuna'), jornadas=range(1, 11), semilla=0):
+    rng = np.random.default_rng(semilla)
+    filas = [
+        {'equipo': equipo, 'temporada': '2023/2024', 'jornada': jornada,
+         'goles': float(rng.integers(0, 4)), 'tiros': float(rng.integers(5, 20))}
+        for equipo in equipos for jornada in jornadas
+    ]
+    return pd.DataFrame(filas)
+
+
+def _ordenar(df):
+    return df.sort_values(CLAVES).reset_index(drop=True)[sorted(df.columns)]
+
+
+def test_append_in_order_matches_full_recompute():
+    df = _jornadas()
+    serie = compute_rolling(df[df['jornada'] <= 6])
+    resultado = append_matchdays(serie, df[df['jornada'] > 6])
+    tm.assert_frame_equal(_ordenar(resultado), _ordenar(compute_rolling(df)))
+
+
+def test_append_out_of_order_matchday_matches_full_recompute():
+    df = _jornadas()
+    serie = compute_rolling(df[df['jornada'] != 5])
+    resultado = append_matchdays(serie, df[df['jornada'] == 5])
+    tm.assert_frame_equal(_ordenar(resultado), _ordenar(compute_rolling(df)))
+
+
+def _fuentes(tmp_path, jornadas=range(1, 11), equipos=('Alavés', 'Osasuna')):
+    """Escribe KPI_equipos y acumulados sintéticos con las jornadas dadas; devuelve sus rutas"""
+    acumulados = _jornadas(equipos=equipos)
+    acumulados[['goles', 'tiros']] = acumulados.groupby('equipo')[['goles', 'tiros']].cumsum()
+    kpis = _jornadas(equipos=equipos, semilla=1).rename(columns={'goles': 'xg', 'tiros': 'pases'})
+    kpi_path, acum_path = str(tmp_path / 'kpi.parquet'), str(tmp_path / 'acum.parquet')
+    kpis[kpis['jornada'].isin(jornadas)].to_parquet(kpi_path)
+    acumulados[acumulados['jornada'].isin(jornadas)].to_parquet(acum_path)
+    return kpi_path, acum_path
+
+
+def _update_twice(tmp_path, antes, despues):
+    """Serie incremental (primero 'antes', después 'despues') y serie calculada de cero"""
+    salida = str(tmp_path / 'kpi_series.parquet')
+    kpi_path, acum_path = _fuentes(tmp_path, antes)
+    kpi_series.update_kpi_series(salida, kpi_path=kpi_path, acumulados_path=acum_path)
+    kpi_path, acum_path = _fuentes(tmp_path, despues)
+    incremental = kpi_series.update_kpi_series(salida, kpi_path=kpi_path, acumulados_path=acum_path)
+    completa = compute_rolling(load_matchday_kpis(kpi_path, acum_path))
+    return _ordenar(incremental), _ordenar(completa)
+
+
+def test_update_new_matchdays_matches_full_recompute(tmp_path):
+    incremental, completa = _update_twice(tmp_path, range(1, 7), range(1, 11))
+    tm.assert_frame_equal(incremental, completa, check_dtype=False)
+
+
+def test_update_late_matchday_matches_full_recompute(tmp_path):
+    # La jornada 5 llega tarde: cambia también la diferencia de acumulados de la 6
+    incremental, completa = _update_twice(tmp_path, [1, 2, 3, 4, 6, 7, 8, 9, 10], range(1, 11))
+    tm.assert_frame_equal(incremental, completa, check_dtype=False)
+
+
+def test_update_drops_matchdays_removed_from_source(tmp_path):
+    incremental, completa = _update_twice(tmp_path, range(1, 11), [1, 2, 3, 4, 6, 7, 8, 9, 10])
+    assert 5 not in incremental['jornada'].tolist()
+    tm.assert_frame_equal(incremental, completa, check_dtype=False)
+
+
+def test_update_reads_only_new_rows(tmp_path, monkeypatch):
+    salida = str(tmp_path / 'kpi_series.parquet')
+    kpi_path, acum_path = _fuentes(tmp_path, range(1, 9))
+    kpi_series.update_kpi_series(salida, kpi_path=kpi_path, acumulados_path=acum_path)
+
+    leidas = []
+    leer = kpi_series._read_new_rows
+    monkeypatch.setattr(kpi_series, '_read_new_rows', lambda *args: leidas.append(leer(*args)) or leidas[-1])
+    kpi_path, acum_path = _fuentes(tmp_path, range(1, 11))
+    kpi_series.update_kpi_series(salida, kpi_path=kpi_path, acumulados_path=acum_path)
+
+    assert [sorted(df['jornada'].unique()) for df in leidas] == [[9, 10], [9, 10]]
+
+
+def test_cumulative_diff_fills_only_first_matchday(tmp_path):
+    acumulados = _jornadas(equipos=('Alavés',), jornadas=range(1, 5))
+    acumulados['goles'] = [1.0, 3.0, np.nan, 6.0]
+    kpis = acumulados[CLAVES].assign(xg=1.0)
+    acumulados.to_parquet(tmp_path / 'acum.parquet')
+    kpis.to_parquet(tmp_path / 'kpi.parquet')
+
+    df = load_matchday_kpis(str(tmp_path / 'kpi.parquet'), str(tmp_path / 'acum.parquet'))
+
+    # Primera jornada: su acumulado; un hueco a mitad de temporada no se rellena con el acumulado
+    assert df['acum_goles'].iloc[0] == 1.0
+    assert df['acum_goles'].iloc[1] == 2.0
+    assert df['acum_goles'].iloc[2:].isna().all()
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.percentiles import build_percentile_table, is_inverted_metric, is_ratio_metric  # noqa: E402
+
+
+@pytest.mark.parametrize('columna', ['accurate_passes', 'xg_generated', 'upper_third_entries', 'fouls_won'])
+def test_counts_are_not_ratios(columna):
+    assert not is_ratio_metric(columna)
+
+
+@pytest.mark.parametrize('columna', ['pass_accuracy', 'pass_success_rate', 'passes_per_90', 'pass_%'])
+def test_ratios(columna):
+    assert is_ratio_metric(columna)
+
+
+@pytest.mark.parametrize('columna,invertida', [
+    ('fouls', True), ('fouls_committed', True), ('turnovers', True), ('duels_lost', True),
+    ('fouls_won', False), ('fouls_suffered', False), ('faltas_recibidas', False), ('accurate_passes', False),
+])
+def test_inverted_metrics(columna, invertida):
+    assert is_inverted_metric(columna) == invertida
+
+
+def test_build_percentile_table(tmp_path):
+    # Dos partidos por jugador; el jugador 2 juega la mitad de minutos con los mismos conteos
+    df = pd.DataFrame({
+        'season_id': 1,
+        'player_id': [1, 1, 2, 2],
+        'match_id': [10, 11, 10, 11],
+        'minutes_played': [90, 90, 45, 45],
+        'position': 'CM',
+        'accurate_passes': [40, 40, 40, 40],
+        'upper_third_entries': [2, 4, 2, 4],
+        'pass_accuracy': [80.0, 90.0, 70.0, 70.0],
+        'fouls_won': [1, 1, 3, 3],
+        'fouls_committed': [1, 1, 3, 3],
+    })
+    df.to_parquet(tmp_path / 'stats.parquet')
+
+    tabla = build_percentile_table(str(tmp_path / 'stats.parquet'), str(tmp_path / 'pct.parquet'), min_minutos=0)
+    valores = tabla.pivot(index='player_id', columns='metrica', values='valor_p90')
+    percentiles = tabla.pivot(index='player_id', columns='metrica', values='percentil')
+
+    # Conteos por 90 minutos
+    assert valores.loc[1, 'accurate_passes'] == 40
+    assert valores.loc[2, 'accurate_passes'] == 80
+    assert valores.loc[1, 'upper_third_entries'] == 3
+    # Tasa como media ponderada por minutos, sin normalizar por 90
+    assert valores.loc[1, 'pass_accuracy'] == 85
+    assert valores.loc[2, 'pass_accuracy'] == 70
+    # Más faltas recibidas es mejor; más faltas cometidas es peor
+    assert percentiles.loc[2, 'fouls_won'] > percentiles.loc[1, 'fouls_won']
+    assert percentiles.loc[2, 'fouls_committed'] < percentiles.loc[1, 'fouls_committed']
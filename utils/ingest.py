@@ -0,0 +1,94 @@
+"""
+Reconstrucción de las tablas derivadas (data/derivados) tras una ingesta.
+
+    python -m utils.ingest [carpeta_parquet] [carpeta_derivados] [--pasos ...]
+
+Los pasos se ejecutan siempre en este orden, porque el índice de similitud
+se construye a partir de la tabla de percentiles:
+
+    percentiles -> similitud -> forma -> kpis
+
+Todos los pasos reciben los mismos argumentos: la carpeta con los parquet
+de origen y la carpeta donde se escriben las tablas derivadas. Tras la
+ingesta hay que reiniciar el servidor (ver wsgi.py).
+"""
+import argparse
+import os
+import sys
+import time
+
+from utils import kpi_series, percentiles, similarity, team_shape
+from utils.rutas import DERIVADOS_DIR, PARQUET_DIR
+
+
+def _en(carpeta, ruta):
+    """Misma tabla (nombre de archivo) en otra carpeta"""
+    return os.path.join(carpeta, os.path.basename(ruta))
+
+
+def build_percentiles(parquet_dir=PARQUET_DIR, derivados_dir=DERIVADOS_DIR):
+    tabla = percentiles.build_percentile_table(_en(parquet_dir, percentiles.STATS_PATH),
+                                               _en(derivados_dir, percentiles.PERCENTILES_PATH))
+    return f"{len(tabla)} filas"
+
+
+def build_similarity(parquet_dir=PARQUET_DIR, derivados_dir=DERIVADOS_DIR):
+    indice = similarity.build_similarity_index(
+        _en(derivados_dir, similarity.INDICE_PATH),
+        percentiles_path=_en(derivados_dir, percentiles.PERCENTILES_PATH),
+        eventos_path=_en(parquet_dir, similarity.EVENTOS_PATH),
+        nombres_path=_en(parquet_dir, similarity.NOMBRES_PATH),
+    )
+    return f"{len(indice['vectores'])} jugadores-temporada"
+
+
+def build_team_shape(parquet_dir=PARQUET_DIR, derivados_dir=DERIVADOS_DIR):
+    tabla = team_shape.build_team_shapes(_en(parquet_dir, team_shape.EVENTOS_PATH),
+                                         _en(derivados_dir, team_shape.FORMA_PATH),
+                                         partidos_path=_en(parquet_dir, team_shape.PARTIDOS_PATH))
+    return f"{len(tabla)} filas"
+
+
+def build_kpi_series(parquet_dir=PARQUET_DIR, derivados_dir=DERIVADOS_DIR):
+    tabla = kpi_series.update_kpi_series(_en(derivados_dir, kpi_series.SERIES_PATH),
+                                         kpi_path=_en(parquet_dir, kpi_series.KPI_PATH),
+                                         acumulados_path=_en(parquet_dir, kpi_series.ACUMULADOS_PATH))
+    return f"{len(tabla)} filas"
+
+
+# Orden de ejecución (cada paso puede depender de los anteriores)
+PASOS = [
+    ('percentiles', build_percentiles),
+    ('similitud', build_similarity),
+    ('forma', build_team_shape),
+    ('kpis', build_kpi_series),
+]
+
+
+def run_ingest(parquet_dir=PARQUET_DIR, derivados_dir=DERIVADOS_DIR, pasos=None):
+    """
+    Reconstruye las tablas derivadas en orden. Con 'pasos' sólo se ejecutan
+    esos, pero respetando el orden de PASOS. Un paso que falla detiene la
+    ingesta para no construir tablas sobre otras desactualizadas.
+    """
+    for nombre, construir in PASOS:
+        if pasos is not None and nombre not in pasos:
+            continue
+        inicio = time.perf_counter()
+        resumen = construir(parquet_dir, derivados_dir)
+        print(f"{nombre}: {resumen} en {time.perf_counter() - inicio:.1f}s")
+
+
+def main(argv=None, pasos=None):
+    parser = argparse.ArgumentParser(description='Reconstruye las tablas derivadas tras una ingesta')
+    parser.add_argument('parquet_dir', nargs='?', default=PARQUET_DIR, help='Carpeta con los parquet de origen')
+    parser.add_argument('derivados_dir', nargs='?', default=DERIVADOS_DIR, help='Carpeta de las tablas derivadas')
+    parser.add_argument('--pasos', nargs='+', choices=[nombre for nombre, _ in PASOS], default=pasos,
+                        help='Ejecutar sólo estos pasos (por defecto todos)')
+    args = parser.parse_args(argv)
+    run_ingest(args.parquet_dir, args.derivados_dir, args.pasos)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+# Series temporales de KPIs de equipo por jornada y en ventana móvil
+import os
+import sys
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pyarrow.types as pat
+
+from utils.rutas import DERIVADOS_DIR, PARQUET_DIR
+
+KPI_PATH = os.path.join(PARQUET_DIR, 'KPI_equipos.parquet')
+ACUMULADOS_PATH = os.path.join(PARQUET_DIR, 'eventos_datos_acumulados.parquet')
+SERIES_PATH = os.path.join(DERIVADOS_DIR, 'kpi_series.parquet')
+
+# Ventana móvil (últimos N partidos)
+VENTANA = 5
+
+# Columnas candidatas (el primer nombre presente en el parquet es el que se usa)
+COLUMNAS_EQUIPO = ['equipo', 'team_name', 'team']
+COLUMNAS_TEMPORADA = ['temporada', 'season', 'season_name']
+COLUMNAS_JORNADA = ['jornada', 'matchday', 'round', 'week', 'match_day']
+
+# Columnas numéricas que no son KPIs
+COLUMNAS_EXCLUIDAS = {'season_id', 'team_id', 'match_id', 'competition_id', 'jornada'}
+
+CLAVES = ['equipo', 'temporada', 'jornada']
+GRUPO = ['equipo', 'temporada']
+SUFIJO_MOVIL = '_movil'
+PREFIJO_ACUMULADOS = 'acum_'
+
+# Fuentes de la serie: KPIs por jornada y acumulados de temporada
+FUENTE_KPI = 'kpi'
+FUENTE_ACUMULADOS = 'acum'
+
+_SERIES = None
+
+
+def _source_columns(columnas):
+    """Columna del parquet que corresponde a equipo, temporada y jornada"""
+    renombrar = {}
+    for destino, candidatas in [('equipo', COLUMNAS_EQUIPO), ('temporada', COLUMNAS_TEMPORADA),
+                                ('jornada', COLUMNAS_JORNADA)]:
+        origen = next((col for col in candidatas if col in columnas), None)
+        if origen is None:
+            raise ValueError(f"No se encontró columna de {destino} (candidatas: {candidatas})")
+        renombrar[origen] = destino
+    return renombrar
+
+
+def _normalize_keys(df):
+    df['equipo'] = df['equipo'].astype(str)
+    df['temporada'] = df['temporada'].astype(str)
+    df['jornada'] = pd.to_numeric(df['jornada'], errors='coerce')
+    return df.dropna(subset=['jornada'])
+
+
+def _normalize(df):
+    """Renombra las columnas clave a equipo/temporada/jornada y deja sólo KPIs numéricos"""
+    df = df.rename(columns=_source_columns(df.columns))
+
+    kpis = [
+        col for col in df.select_dtypes('number').columns
+        if col not in COLUMNAS_EXCLUIDAS and col not in CLAVES
+    ]
+    df = _normalize_keys(df[CLAVES + kpis].copy())
+    # min_count=1: una jornada sin datos queda vacía en lugar de valer 0
+    return df.groupby(CLAVES, as_index=False)[kpis].sum(min_count=1)
+
+
+def _diff_cumulative(df_acum, df_previas=None):
+    """
+    Convierte acumulados de temporada en valores por jornada restando la
+    jornada anterior.
+
+    df_previas son los últimos acumulados ya procesados de algunos equipos y
+    temporadas: se usan como jornada anterior de las filas nuevas. Sólo la
+    primera jornada de un grupo sin fila previa se queda con su acumulado.
+    """
+    kpis = [col for col in df_acum.columns if col not in CLAVES]
+    df = df_acum.assign(_previa=False)
+    if df_previas is not None and not df_previas.empty:
+        df = pd.concat([df_previas[CLAVES + kpis].assign(_previa=True), df], ignore_index=True)
+    df = df.sort_values(CLAVES).reset_index(drop=True)
+
+    grupos = df.groupby(GRUPO)
+    primeras = grupos.cumcount() == 0
+    diferencias = grupos[kpis].diff()
+    diferencias.loc[primeras] = df.loc[primeras, kpis]
+    df_diff = df[CLAVES].join(diferencias)[~df['_previa']]
+    return df_diff.rename(columns={col: f'{PREFIJO_ACUMULADOS}{col}' for col in kpis})
+
+
+def _merge_sources(df_kpi, df_acum):
+    if df_acum is None:
+        return df_kpi.sort_values(CLAVES).reset_index(drop=True)
+    return df_kpi.merge(df_acum, on=CLAVES, how='outer').sort_values(CLAVES).reset_index(drop=True)
+
+
+def _state(df_kpi, df_acum_bruto):
+    """
+    Estado de la ingesta: claves ya procesadas de cada fuente y, para los
+    acumulados, sus valores sin diferenciar (el último de cada grupo es la
+    jornada anterior de la siguiente ingesta).
+    """
+    partes = [df_kpi[CLAVES].assign(fuente=FUENTE_KPI)]
+    if df_acum_bruto is not None:
+        partes.append(df_acum_bruto.assign(fuente=FUENTE_ACUMULADOS))
+    return pd.concat(partes, ignore_index=True)
+
+
+def _load_full(kpi_path, acumulados_path):
+    """KPIs por jornada y estado de ingesta leyendo las dos fuentes completas"""
+    df_kpi = _normalize(pd.read_parquet(kpi_path))
+
+    df_acum_bruto = df_acum = None
+    try:
+        df_acum_bruto = _normalize(pd.read_parquet(acumulados_path))
+        df_acum = _diff_cumulative(df_acum_bruto)
+    except Exception as e:
+        print(f"Error cargando eventos acumulados {acumulados_path}: {e}")
+
+    return _merge_sources(df_kpi, df_acum), _state(df_kpi, df_acum_bruto)
+
+
+def load_matchday_kpis(kpi_path=KPI_PATH, acumulados_path=ACUMULADOS_PATH):
+    """
+    KPIs de cada equipo por jornada, leyendo las dos fuentes completas.
+
+    Los de KPI_equipos se usan tal cual; los de eventos_datos_acumulados son
+    acumulados de temporada y se convierten a valor por jornada con la
+    diferencia respecto a la jornada anterior (la primera jornada de cada
+    equipo y temporada se queda con su acumulado).
+    """
+    return _load_full(kpi_path, acumulados_path)[0]
+
+
+def _kpi_columns(df):
+    return [col for col in df.columns if col not in CLAVES and not col.endswith(SUFIJO_MOVIL)]
+
+
+def compute_rolling(df_jornadas, ventana=VENTANA):
+    """Añade la media de los últimos 'ventana' partidos de cada KPI, por equipo y temporada"""
+    kpis = _kpi_columns(df_jornadas)
+    df = df_jornadas.sort_values(CLAVES)
+    moviles = (
+        df.groupby(GRUPO)[kpis]
+        .rolling(ventana, min_periods=1).mean()
+        .reset_index(level=[0, 1], drop=True)
+    )
+    return df.join(moviles.add_suffix(SUFIJO_MOVIL))
+
+
+def append_matchdays(df_series, df_nuevas, ventana=VENTANA):
+    """
+    Añade jornadas a una serie ya calculada.
+
+    Sólo se recalcula lo afectado: para cada equipo y temporada con
+    jornadas nuevas se recalculan las medias desde la primera jornada nueva
+    en adelante (aunque llegue fuera de orden), usando como cola las
+    ventana-1 jornadas anteriores a ella. El resto de la serie no se toca.
+    """
+    if df_series is None or df_series.empty:
+        return compute_rolling(df_nuevas, ventana)
+
+    kpis = _kpi_columns(df_nuevas)
+    desde = df_nuevas.groupby(GRUPO, as_index=False)['jornada'].min().rename(columns={'jornada': '_desde'})
+    df_series = df_series.merge(desde, on=GRUPO, how='left')
+
+    afectadas = df_series['jornada'] >= df_series['_desde']
+    anteriores = df_series['jornada'] < df_series['_desde']
+    cola = df_series[anteriores].sort_values(CLAVES).groupby(GRUPO).tail(ventana - 1)
+
+    # Las filas de df_nuevas sustituyen a las existentes con la misma jornada
+    df_tramo = pd.concat([cola[CLAVES + kpis], df_series.loc[afectadas, CLAVES + kpis], df_nuevas[CLAVES + kpis]],
+                         ignore_index=True).drop_duplicates(CLAVES, keep='last')
+    df_tramo = compute_rolling(df_tramo, ventana).merge(desde, on=GRUPO)
+    df_tramo = df_tramo[df_tramo['jornada'] >= df_tramo['_desde']]
+
+    return (
+        pd.concat([df_series[~afectadas], df_tramo], ignore_index=True)
+        .drop(columns='_desde')
+        .sort_values(CLAVES)
+        .reset_index(drop=True)
+    )
+
+
+def _read_keys(path):
+    """Claves distintas de una fuente; sólo se leen las tres columnas clave"""
+    renombrar = _source_columns(pq.read_schema(path).names)
+    df = pd.read_parquet(path, columns=list(renombrar)).rename(columns=renombrar)
+    # Valor original del equipo para filtrar al leer las filas
+    df['_equipo_origen'] = df['equipo']
+    return _normalize_keys(df).drop_duplicates(CLAVES)
+
+
+def _read_new_rows(path, ultimas, equipos_completos):
+    """
+    Lee de una fuente sólo las filas posteriores a la última jornada
+    procesada de cada equipo y temporada ('ultimas'), y todas las de los
+    grupos que no están en 'ultimas' (nuevos o a recalcular), que son de
+    los equipos de 'equipos_completos' (valores originales del parquet).
+    """
+    esquema = pq.read_schema(path)
+    origen = {destino: col for col, destino in _source_columns(esquema.names).items()}
+    tipo_jornada = esquema.field(origen['jornada']).type
+
+    filtros = None
+    if not ultimas.empty and (pat.is_integer(tipo_jornada) or pat.is_floating(tipo_jornada)):
+        minima = ultimas['jornada'].min()
+        filtros = [[(origen['jornada'], '>', int(minima) if pat.is_integer(tipo_jornada) else float(minima))]]
+        if equipos_completos:
+            filtros.append([(origen['equipo'], 'in', list(equipos_completos))])
+    df = _normalize(pd.read_parquet(path, filters=filtros))
+
+    df = df.merge(ultimas.rename(columns={'jornada': '_ultima'}), on=GRUPO, how='left')
+    return df[df['_ultima'].isna() | (df['jornada'] > df['_ultima'])].drop(columns='_ultima')
+
+
+def _anti_join(df, otro, columnas):
+    marcadas = df.merge(otro[columnas].drop_duplicates().assign(_en_otro=True), on=columnas, how='left')
+    return df[marcadas['_en_otro'].isna().to_numpy()]
+
+
+def _dirty_groups(claves_fuente, procesadas, claves_serie):
+    """
+    Grupos que hay que recalcular enteros: con jornadas que ya no están en
+    la fuente, o con jornadas nuevas que no van después de la última
+    procesada (llegan tarde o ya están en la serie por la otra fuente).
+    """
+    eliminadas = _anti_join(procesadas, claves_fuente, CLAVES)
+    nuevas = _anti_join(claves_fuente, procesadas, CLAVES)
+    ultimas = procesadas.groupby(GRUPO, as_index=False)['jornada'].max().rename(columns={'jornada': '_ultima'})
+    nuevas = nuevas.merge(ultimas, on=GRUPO, how='left')
+    en_serie = nuevas.merge(claves_serie.assign(_en_serie=True), on=CLAVES, how='left')['_en_serie'].notna()
+    tardias = nuevas[(nuevas['jornada'] <= nuevas['_ultima']).to_numpy() | en_serie.to_numpy()]
+    return pd.concat([eliminadas[GRUPO], tardias[GRUPO]]).drop_duplicates()
+
+
+def _update_incremental(df_series, df_estado, kpi_path, acumulados_path, ventana):
+    """
+    Actualiza la serie leyendo sólo las filas nuevas de cada fuente.
+
+    Devuelve (serie, estado), o None si hace falta un cálculo completo.
+    """
+    rutas = {FUENTE_KPI: kpi_path, FUENTE_ACUMULADOS: acumulados_path}
+    if set(df_estado['fuente'].unique()) != set(rutas):
+        return None
+
+    claves = {fuente: _read_keys(ruta) for fuente, ruta in rutas.items()}
+    procesadas = {fuente: df_estado.loc[df_estado['fuente'] == fuente, CLAVES] for fuente in rutas}
+
+    # Grupos a recalcular enteros en las dos fuentes, incluidos los que ya no están en ninguna
+    sucios = pd.concat(
+        [_dirty_groups(claves[f], procesadas[f], df_series[CLAVES]) for f in rutas], ignore_index=True
+    ).drop_duplicates()
+
+    nuevas = {}
+    for fuente, ruta in rutas.items():
+        ultimas = _anti_join(procesadas[fuente].groupby(GRUPO, as_index=False)['jornada'].max(), sucios, GRUPO)
+        completos = _anti_join(claves[fuente], ultimas, GRUPO)
+        nuevas[fuente] = _read_new_rows(ruta, ultimas, set(completos['_equipo_origen']))
+
+    # Acumulados: la jornada anterior de las filas nuevas es la última procesada de su grupo
+    df_acum_estado = _anti_join(df_estado[df_estado['fuente'] == FUENTE_ACUMULADOS], sucios, GRUPO)
+    previas = df_acum_estado.drop(columns='fuente').sort_values(CLAVES).groupby(GRUPO).tail(1)
+    df_acum = _diff_cumulative(nuevas[FUENTE_ACUMULADOS], previas)
+    df_nuevas = _merge_sources(nuevas[FUENTE_KPI], df_acum)
+
+    if set(_kpi_columns(df_nuevas)) != set(_kpi_columns(df_series)):
+        return None
+
+    df_series = _anti_join(df_series, sucios, GRUPO)
+    if not df_nuevas.empty:
+        df_series = append_matchdays(df_series, df_nuevas, ventana)
+
+    df_estado = pd.concat([
+        _anti_join(df_estado, sucios, GRUPO),
+        _state(nuevas[FUENTE_KPI], nuevas[FUENTE_ACUMULADOS]),
+    ], ignore_index=True)
+    return df_series.reset_index(drop=True), df_estado
+
+
+def _state_path(output_path):
+    return os.path.splitext(output_path)[0] + '_estado.parquet'
+
+
+def update_kpi_series(output_path=SERIES_PATH, ventana=VENTANA, kpi_path=KPI_PATH, acumulados_path=ACUMULADOS_PATH):
+    """
+    Actualiza la tabla derivada tras una ingesta.
+
+    Si ya existe, de cada fuente se leen las columnas clave (para detectar
+    jornadas eliminadas o que llegan tarde) y sólo las filas posteriores a
+    la última jornada procesada de cada equipo y temporada; los acumulados
+    se diferencian contra el último acumulado guardado en el estado
+    (<salida>_estado.parquet) y las medias móviles se recalculan desde la
+    primera jornada nueva. Los grupos con jornadas eliminadas o tardías se
+    recalculan enteros. Sin tabla previa, o si cambian los KPIs, se calcula
+    todo.
+    """
+    estado_path = _state_path(output_path)
+    resultado = None
+    if os.path.exists(output_path) and os.path.exists(estado_path):
+        try:
+            df_series = pd.read_parquet(output_path)
+            df_estado = pd.read_parquet(estado_path)
+            resultado = _update_incremental(df_series, df_estado, kpi_path, acumulados_path, ventana)
+        except Exception as e:
+            print(f"Recalculando series de KPIs completas ({e})")
+
+    if resultado is None:
+        df_jornadas, df_estado = _load_full(kpi_path, acumulados_path)
+        df_series = compute_rolling(df_jornadas, ventana).reset_index(drop=True)
+    else:
+        df_series, df_estado = resultado
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df_series.to_parquet(output_path, index=False)
+    df_estado.to_parquet(estado_path, index=False)
+    return df_series
+
+
+def load_kpi_series_table(path=SERIES_PATH):
+    """Carga la tabla derivada en memoria (una vez por proceso)"""
+    global _SERIES
+    try:
+        _SERIES = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Error cargando series de KPIs {path}: {e}")
+        _SERIES = None
+    return _SERIES
+
+
+def load_kpi_series(team, season, path=SERIES_PATH):
+    """Serie de KPIs de un equipo y temporada, ordenada por jornada"""
+    if _SERIES is None and load_kpi_series_table(path) is None:
+        return pd.DataFrame()
+    df = _SERIES[(_SERIES['equipo'] == str(team)) & (_SERIES['temporada'] == str(season))]
+    return df.sort_values('jornada')
+
+
+if __name__ == '__main__':
+    # Mismos argumentos que utils/ingest.py ([carpeta_parquet] [carpeta_derivados]);
+    # para reconstruir todo en orden: python -m utils.ingest
+    from utils import ingest
+    sys.exit(ingest.main(pasos=['kpis']))
@@ -0,0 +1,13 @@
+# Métricas de eventos_metricas_alaves compartidas por las páginas y los índices derivados
+
+# Conteos de acciones por zona y tipo de pase (sumables por jugador/equipo)
+METRICAS_EVENTOS = [
+    'duelos_aereos_ganados_zona_area', 'duelos_aereos_ganados_zona_baja', 
+    'duelos_aereos_ganados_zona_media', 'duelos_aereos_ganados_zona_alta',
+    'recuperaciones_zona_baja', 'recuperaciones_zona_media', 'recuperaciones_zona_alta',
+    'entradas_ganadas_zona_area', 'entradas_ganadas_zona_baja', 
+    'entradas_ganadas_zona_media', 'entradas_ganadas_zona_alta',
+    'pases_largos_exitosos', 'cambios_orientacion_exitosos',
+    'pases_adelante_inicio', 'pases_adelante_creacion',
+    'pases_horizontal_inicio', 'pases_horizontal_creacion'
+]
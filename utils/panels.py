@@ -0,0 +1,51 @@
+# Actualizaciones parciales de contenedores de paneles con dash.Patch
+import base64
+import hashlib
+import io
+
+import matplotlib
+matplotlib.use('Agg')  # Usar backend sin interfaz gráfica
+import matplotlib.pyplot as plt
+from dash import Patch, no_update
+
+
+def fig_to_base64(fig):
+    """Convierte una figura de matplotlib a PNG en base64 y la cierra"""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    plt.close(fig)  # Cerrar la figura después de guardarla
+    buf.seek(0)
+    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+
+def panel_hash(*partes):
+    """Huella corta del contenido de un panel (título, imagen, ...)"""
+    h = hashlib.md5()
+    for parte in partes:
+        h.update(str(parte).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def build_panel_update(paneles, hashes, hashes_previos):
+    """
+    Calcula qué enviar a un contenedor cuyos hijos son una lista de paneles.
+
+    - paneles: componentes nuevos, en orden
+    - hashes: huella de cada panel nuevo
+    - hashes_previos: huellas de lo que muestra el cliente (dcc.Store)
+
+    Si el número de paneles coincide sólo se envían, con un Patch, los que
+    han cambiado; si no cambia ninguno no se envía nada. Devuelve la pareja
+    (children, hashes) para las dos salidas del callback.
+    """
+    if not hashes_previos or len(hashes_previos) != len(hashes):
+        return paneles, hashes
+
+    cambiados = [i for i, (nuevo, previo) in enumerate(zip(hashes, hashes_previos)) if nuevo != previo]
+    if not cambiados:
+        return no_update, no_update
+
+    patch = Patch()
+    for i in cambiados:
+        patch[i] = paneles[i]
+    return patch, hashes
@@ -0,0 +1,212 @@
+# Tabla precalculada de percentiles de liga para los gráficos de radar/pizza
+import os
+import re
+import sys
+
+import pandas as pd
+
+from utils.rutas import DERIVADOS_DIR, PARQUET_DIR
+
+STATS_PATH = os.path.join(PARQUET_DIR, 'player_stats_extended_league_all.parquet')
+PERCENTILES_PATH = os.path.join(DERIVADOS_DIR, 'percentiles_jugadores.parquet')
+
+# Minutos mínimos en la temporada para entrar en la población de referencia
+MIN_MINUTOS = 270
+
+# Columnas candidatas (el primer nombre presente en el parquet es el que se usa)
+COLUMNAS_MINUTOS = ['minutes_played', 'play_time', 'minutos_jugados', 'minutes']
+COLUMNAS_POSICION = ['position', 'main_position', 'demarcacion']
+
+# Columnas numéricas que no son métricas de rendimiento
+COLUMNAS_EXCLUIDAS = {
+    'player_id', 'season_id', 'match_id', 'team_id', 'competition_id',
+    'event_id', 'jersey_number', 'back_number', 'age', 'height', 'weight',
+}
+
+# Los patrones se comparan por palabras completas del nombre de la columna
+# (separadas por '_'): 'rate' no coincide con 'accurate_passes' ni 'per'
+# con 'upper_third_entries'. Un patrón de varias palabras exige todas.
+
+# Columnas que ya son tasas o porcentajes: se promedian ponderando por
+# minutos y no se normalizan por 90
+PATRONES_RATIO = [
+    'accuracy', 'percent', 'percentage', 'pct', 'ratio', 'rate', 'per', 'avg', 'average',
+    'porcentaje', 'precision', 'promedio', 'media', 'efectividad', '%',
+]
+
+# Métricas en las que un valor menor es mejor: se invierten antes del ranking
+PATRONES_INVERTIDOS = [
+    'foul', 'fouls', 'loss', 'losses', 'lost', 'error', 'errors', 'turnover', 'turnovers',
+    'card', 'cards', 'offside', 'offsides', 'miscontrol', 'miscontrols',
+    'falta', 'faltas', 'perdida', 'perdidas', 'pérdida', 'pérdidas', 'tarjeta', 'tarjetas',
+    'fuera_de_juego',
+]
+
+# Palabras que indican que la acción es a favor del jugador (faltas recibidas...)
+PATRONES_A_FAVOR = [
+    'won', 'suffered', 'drawn', 'received', 'ganada', 'ganadas', 'recibida', 'recibidas',
+    'provocada', 'provocadas', 'sufrida', 'sufridas',
+]
+
+# Palabras clave para agrupar demarcaciones (códigos BePro y nombres en castellano)
+GRUPOS_POSICION = [
+    ('Portero', ['GK', 'POR', 'PORTERO', 'GOALKEEPER']),
+    ('Defensa', ['CB', 'LB', 'RB', 'LWB', 'RWB', 'DF', 'DEFENSA', 'CENTRAL', 'LATERAL', 'DEFENDER']),
+    ('Centrocampista', ['DM', 'CM', 'AM', 'LM', 'RM', 'MF', 'MEDIO', 'PIVOTE', 'MIDFIELDER']),
+    ('Delantero', ['LW', 'RW', 'CF', 'ST', 'FW', 'DELANTERO', 'EXTREMO', 'PUNTA', 'FORWARD']),
+]
+
+# Índice en memoria: (player_id, season_id) -> perfil
+_INDICE = None
+
+
+def _primera_columna(df, candidatas):
+    """Devuelve la primera columna candidata presente en el DataFrame"""
+    for col in candidatas:
+        if col in df.columns:
+            return col
+    return None
+
+
+def _tokens(texto):
+    """Palabras de un nombre de columna ('pass_success_%' -> {'pass', 'success', '%'})"""
+    return set(re.findall(r'[^\W_]+|%', texto.lower()))
+
+
+def _matches(columna, patrones):
+    palabras = _tokens(columna)
+    return any(_tokens(patron) <= palabras for patron in patrones)
+
+
+def is_ratio_metric(columna):
+    """Indica si la columna es una tasa/porcentaje en lugar de un conteo"""
+    return _matches(columna, PATRONES_RATIO)
+
+
+def is_inverted_metric(columna):
+    """Indica si en la métrica un valor menor es mejor (faltas cometidas, pérdidas, errores...)"""
+    return _matches(columna, PATRONES_INVERTIDOS) and not _matches(columna, PATRONES_A_FAVOR)
+
+
+def get_position_group(posicion):
+    """Agrupa una demarcación concreta en Portero/Defensa/Centrocampista/Delantero"""
+    if posicion is None or pd.isna(posicion):
+        return 'Otros'
+    texto = str(posicion).upper()
+    tokens = set(texto.replace('-', ' ').replace('/', ' ').split())
+    for grupo, claves in GRUPOS_POSICION:
+        if any(clave in tokens or (len(clave) > 3 and clave in texto) for clave in claves):
+            return grupo
+    return 'Otros'
+
+
+def build_percentile_table(stats_path=STATS_PATH, output_path=PERCENTILES_PATH, min_minutos=MIN_MINUTOS):
+    """
+    Calcula los percentiles de liga por temporada, grupo de posición y métrica.
+
+    Los conteos se suman y se normalizan por 90 minutos; las tasas y
+    porcentajes (is_ratio_metric) se promedian ponderando por minutos y se
+    dejan en su escala. En las métricas donde menos es mejor
+    (is_inverted_metric) el percentil se invierte, de modo que un percentil
+    alto siempre es bueno. El ranking se hace de forma vectorizada con
+    groupby().rank() y el resultado se guarda en formato largo (una fila por
+    jugador, temporada y métrica) en output_path.
+    """
+    df = pd.read_parquet(stats_path)
+
+    col_minutos = _primera_columna(df, COLUMNAS_MINUTOS)
+    col_posicion = _primera_columna(df, COLUMNAS_POSICION)
+    if col_minutos is None:
+        raise ValueError(f"No se encontró columna de minutos en {stats_path}")
+
+    metricas = [
+        col for col in df.select_dtypes('number').columns
+        if col not in COLUMNAS_EXCLUIDAS and col != col_minutos
+    ]
+    ratios = [col for col in metricas if is_ratio_metric(col)]
+    conteos = [col for col in metricas if col not in ratios]
+
+    # Para la media ponderada de las tasas: suma de tasa*minutos y de los
+    # minutos en los que la tasa tiene valor
+    minutos = df[col_minutos].fillna(0)
+    df_agregar = df[['season_id', 'player_id', col_minutos] + conteos].copy()
+    for col in ratios:
+        df_agregar[f'{col}__pond'] = df[col] * minutos
+        df_agregar[f'{col}__min'] = minutos.where(df[col].notna(), 0)
+
+    # Agregar por jugador y temporada (el parquet puede venir a nivel de partido)
+    agregaciones = {col: 'sum' for col in df_agregar.columns if col not in ('season_id', 'player_id')}
+    if col_posicion is not None:
+        df_agregar[col_posicion] = df[col_posicion]
+        agregaciones[col_posicion] = lambda x: x.mode().iat[0] if x.notna().any() else None
+    df_temporada = df_agregar.groupby(['season_id', 'player_id'], observed=True).agg(agregaciones).reset_index()
+
+    df_temporada = df_temporada[df_temporada[col_minutos] >= min_minutos]
+    if col_posicion is not None:
+        df_temporada['grupo_posicion'] = df_temporada[col_posicion].map(get_position_group)
+    else:
+        df_temporada['grupo_posicion'] = 'Otros'
+
+    # Conteos por 90 minutos; tasas como media ponderada por minutos
+    factor = 90.0 / df_temporada[col_minutos]
+    df_p90 = df_temporada[conteos].mul(factor, axis=0)
+    for col in ratios:
+        df_p90[col] = df_temporada[f'{col}__pond'] / df_temporada[f'{col}__min'].replace(0, float('nan'))
+    df_p90 = df_p90[metricas]
+    df_p90[['season_id', 'player_id', 'grupo_posicion']] = df_temporada[['season_id', 'player_id', 'grupo_posicion']]
+    df_p90['minutos'] = df_temporada[col_minutos]
+
+    # Percentil dentro de cada temporada y grupo de posición (invertido donde menos es mejor)
+    signo = pd.Series([-1.0 if is_inverted_metric(col) else 1.0 for col in metricas], index=metricas)
+    df_orden = df_p90[metricas].mul(signo, axis=1)
+    df_orden[['season_id', 'grupo_posicion']] = df_p90[['season_id', 'grupo_posicion']]
+    df_pct = df_orden.groupby(['season_id', 'grupo_posicion'], observed=True)[metricas].rank(pct=True) * 100
+
+    claves = ['season_id', 'player_id', 'grupo_posicion', 'minutos']
+    df_largo = df_p90.melt(id_vars=claves, value_vars=metricas, var_name='metrica', value_name='valor_p90')
+    df_largo['percentil'] = df_pct.melt(value_vars=metricas)['value'].to_numpy()
+    df_largo = df_largo.dropna(subset=['percentil'])
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df_largo.to_parquet(output_path, index=False)
+    return df_largo
+
+
+def load_percentile_index(path=PERCENTILES_PATH):
+    """Carga la tabla de percentiles y construye el índice (player_id, season_id) -> perfil"""
+    global _INDICE
+    try:
+        df = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Error cargando percentiles {path}: {e}")
+        _INDICE = {}
+        return _INDICE
+
+    indice = {}
+    for (season_id, player_id), grupo in df.groupby(['season_id', 'player_id'], observed=True, sort=False):
+        indice[(str(player_id), str(season_id))] = {
+            'grupo_posicion': grupo['grupo_posicion'].iat[0],
+            'percentiles': dict(zip(grupo['metrica'], grupo['percentil'])),
+            'valores_p90': dict(zip(grupo['metrica'], grupo['valor_p90'])),
+        }
+    _INDICE = indice
+    return _INDICE
+
+
+def get_player_profile(player_id, season_id):
+    """
+    Devuelve el perfil de percentiles de un jugador en una temporada.
+
+    La búsqueda es un acceso a diccionario; la tabla sólo se lee la primera vez.
+    Devuelve None si el jugador no tiene minutos suficientes esa temporada.
+    """
+    if _INDICE is None:
+        load_percentile_index()
+    return _INDICE.get((str(player_id), str(season_id)))
+
+
+if __name__ == '__main__':
+    # Mismos argumentos que utils/ingest.py ([carpeta_parquet] [carpeta_derivados]);
+    # para reconstruir todo en orden: python -m utils.ingest
+    from utils import ingest
+    sys.exit(ingest.main(pasos=['percentiles']))
@@ -0,0 +1,10 @@
+# Carpetas de datos compartidas por las páginas y las tablas derivadas
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# DASHALAVES_DATA_DIR apunta la aplicación a otro conjunto de datos con la
+# misma estructura (p. ej. el sintético de load_test.py --synthetic-data)
+DATA_DIR = os.environ.get('DASHALAVES_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+PARQUET_DIR = os.path.join(DATA_DIR, 'archivos_parquet')
+DERIVADOS_DIR = os.path.join(DATA_DIR, 'derivados')
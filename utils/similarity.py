@@ -0,0 +1,202 @@
+# Búsqueda de jugadores similares con un índice de vecinos más cercanos
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from utils.metricas import METRICAS_EVENTOS
+from utils.percentiles import PERCENTILES_PATH
+from utils.rutas import DERIVADOS_DIR, PARQUET_DIR
+
+EVENTOS_PATH = os.path.join(PARQUET_DIR, 'eventos_metricas_alaves.parquet')
+NOMBRES_PATH = os.path.join(PARQUET_DIR, 'names_players_league_all.parquet')
+INDICE_PATH = os.path.join(DERIVADOS_DIR, 'similitud_jugadores.pkl')
+
+COLUMNAS_NOMBRE = ['player_name', 'name', 'jugador', 'nombre']
+
+# Las métricas de eventos_metricas_alaves sólo existen para jugadores del
+# Alavés: se usan únicamente en los índices 'sólo Alavés' y con este peso
+# relativo a las métricas de liga
+PESO_EVENTOS = 0.5
+
+# Clave de la partición que agrupa todas las posiciones de una temporada
+TODAS_POSICIONES = '*'
+
+# Ámbitos de búsqueda: toda la liga o sólo jugadores del Alavés
+AMBITO_LIGA = 'liga'
+AMBITO_ALAVES = 'alaves'
+
+_INDICE = None
+
+
+def _player_names(nombres_path=NOMBRES_PATH):
+    """Diccionario player_id -> nombre a partir de names_players_league_all"""
+    try:
+        df = pd.read_parquet(nombres_path)
+    except Exception as e:
+        print(f"Error cargando nombres {nombres_path}: {e}")
+        return {}
+    col_nombre = next((col for col in COLUMNAS_NOMBRE if col in df.columns), None)
+    if col_nombre is None or 'player_id' not in df.columns:
+        return {}
+    df = df.drop_duplicates('player_id')
+    return dict(zip(df['player_id'].astype(str), df[col_nombre].astype(str)))
+
+
+def _zscore(df):
+    """Estandariza cada columna; las columnas constantes se descartan y los huecos quedan en 0"""
+    df_z = (df - df.mean()) / df.std(ddof=0).replace(0, np.nan)
+    return df_z.dropna(axis=1, how='all').fillna(0.0)
+
+
+def build_feature_matrix(percentiles_path=PERCENTILES_PATH):
+    """
+    Construye los vectores estandarizados (z-score) por 90 minutos de cada
+    jugador y temporada a partir de la tabla de percentiles (estadísticas de
+    liga). Devuelve (df_z, df_info) con grupo de posición y minutos.
+    """
+    df_largo = pd.read_parquet(percentiles_path)
+    claves = ['season_id', 'player_id']
+    # Claves como texto para que los joins no dependan del tipo en cada parquet
+    df_largo[claves] = df_largo[claves].astype(str)
+    df_p90 = df_largo.pivot_table(index=claves, columns='metrica', values='valor_p90')
+    df_info = df_largo.drop_duplicates(claves).set_index(claves)[['grupo_posicion', 'minutos']]
+    return _zscore(df_p90), df_info
+
+
+def build_alaves_features(df_z, df_info, eventos_path=EVENTOS_PATH):
+    """
+    Vectores de los jugadores del Alavés: las métricas de liga (ya
+    estandarizadas contra toda la liga) más las de METRICAS_EVENTOS por 90
+    minutos, estandarizadas sólo entre jugadores del Alavés y ponderadas por
+    PESO_EVENTOS. Devuelve None si no hay datos de eventos.
+    """
+    claves = ['season_id', 'player_id']
+    try:
+        df_eventos = pd.read_parquet(eventos_path, columns=claves + ['equipo'] + METRICAS_EVENTOS)
+    except Exception as e:
+        print(f"Error cargando métricas de eventos {eventos_path}: {e}")
+        return None
+
+    df_eventos = df_eventos[df_eventos['equipo'].astype(str).str.contains('Alav', case=False, na=False)]
+    df_eventos[claves] = df_eventos[claves].astype(str)
+    df_eventos[METRICAS_EVENTOS] = df_eventos[METRICAS_EVENTOS].apply(pd.to_numeric, errors='coerce')
+    df_eventos = df_eventos.groupby(claves)[METRICAS_EVENTOS].sum()
+
+    indice = df_z.index.intersection(df_eventos.index)
+    if indice.empty:
+        return None
+    df_eventos = df_eventos.loc[indice].div(df_info.loc[indice, 'minutos'], axis=0) * 90
+    return df_z.loc[indice].join(_zscore(df_eventos).mul(PESO_EVENTOS).add_prefix('eventos_'))
+
+
+def _build_partitions(df_vectores, df_info, ambito, particiones, vectores):
+    """Un KD-tree por temporada y grupo de posición, más uno por temporada con todas las posiciones"""
+    for season_id, df_temporada in df_vectores.groupby(level='season_id', observed=True):
+        grupos = df_info.loc[df_temporada.index, 'grupo_posicion']
+        for grupo, df_grupo in [(TODAS_POSICIONES, df_temporada)] + list(df_temporada.groupby(grupos.to_numpy())):
+            player_ids = [str(pid) for pid in df_grupo.index.get_level_values('player_id')]
+            particiones[(ambito, str(season_id), grupo)] = (cKDTree(df_grupo.to_numpy()), player_ids)
+
+        for (_, player_id), vector in zip(df_temporada.index, df_temporada.to_numpy()):
+            vectores[(ambito, str(player_id), str(season_id))] = (vector, grupos.loc[(season_id, player_id)])
+
+
+def build_similarity_index(output_path=INDICE_PATH, percentiles_path=PERCENTILES_PATH, eventos_path=EVENTOS_PATH,
+                           nombres_path=NOMBRES_PATH):
+    """
+    Construye y guarda el índice de similitud (se ejecuta en la ingesta,
+    después de reconstruir la tabla de percentiles; ver utils/ingest.py).
+
+    Los árboles de liga sólo usan estadísticas disponibles para todos los
+    jugadores; los de 'sólo Alavés' añaden las métricas de eventos. Los
+    filtros de una consulta se resuelven eligiendo el árbol y no recorriendo
+    jugadores.
+    """
+    df_z, df_info = build_feature_matrix(percentiles_path)
+    nombres = _player_names(nombres_path)
+
+    vectores = {}
+    particiones = {}
+    _build_partitions(df_z, df_info, AMBITO_LIGA, particiones, vectores)
+    df_alaves = build_alaves_features(df_z, df_info, eventos_path)
+    if df_alaves is not None:
+        _build_partitions(df_alaves, df_info, AMBITO_ALAVES, particiones, vectores)
+
+    indice = {
+        'metricas': list(df_z.columns),
+        'vectores': vectores,
+        'particiones': particiones,
+        'nombres': nombres,
+    }
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        pickle.dump(indice, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return indice
+
+
+def load_similarity_index(path=INDICE_PATH):
+    """Carga el índice persistido en memoria"""
+    global _INDICE
+    try:
+        with open(path, 'rb') as f:
+            _INDICE = pickle.load(f)
+    except Exception as e:
+        print(f"Error cargando índice de similitud {path}: {e}")
+        _INDICE = {'metricas': [], 'vectores': {}, 'particiones': {}, 'nombres': {}}
+    return _INDICE
+
+
+def get_similar_players(player_id, season_id, k=10, same_position=True, target_season_id=None, only_alaves=False):
+    """
+    Devuelve los k jugadores más parecidos al jugador en la temporada dada.
+
+    - same_position: buscar sólo en el mismo grupo de posición
+    - target_season_id: temporada donde buscar (por defecto la del jugador)
+    - only_alaves: buscar sólo entre jugadores del Alavés (usa también las
+      métricas de eventos)
+
+    Cada resultado es un diccionario con player_id, jugador, season_id y distancia.
+    """
+    if _INDICE is None:
+        load_similarity_index()
+
+    ambito = AMBITO_ALAVES if only_alaves else AMBITO_LIGA
+    entrada = _INDICE['vectores'].get((ambito, str(player_id), str(season_id)))
+    if entrada is None:
+        return []
+    vector, grupo = entrada
+
+    temporada = str(target_season_id if target_season_id is not None else season_id)
+    particion = _INDICE['particiones'].get((ambito, temporada, grupo if same_position else TODAS_POSICIONES))
+    if particion is None:
+        return []
+    arbol, player_ids = particion
+
+    # Se pide uno más porque el propio jugador aparece en su temporada
+    distancias, posiciones = arbol.query(vector, k=min(k + 1, len(player_ids)))
+    distancias = np.atleast_1d(distancias)
+    posiciones = np.atleast_1d(posiciones)
+
+    resultados = []
+    for distancia, posicion in zip(distancias, posiciones):
+        candidato = player_ids[posicion]
+        if candidato == str(player_id) and temporada == str(season_id):
+            continue
+        resultados.append({
+            'player_id': candidato,
+            'jugador': _INDICE['nombres'].get(candidato, candidato),
+            'season_id': temporada,
+            'distancia': round(float(distancia), 3),
+        })
+    return resultados[:k]
+
+
+if __name__ == '__main__':
+    # Mismos argumentos que utils/ingest.py ([carpeta_parquet] [carpeta_derivados]);
+    # para reconstruir todo en orden: python -m utils.ingest
+    from utils import ingest
+    sys.exit(ingest.main(pasos=['similitud']))
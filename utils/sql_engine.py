@@ -0,0 +1,108 @@
+# Motor SQL embebido (DuckDB) sobre el directorio de archivos Parquet
+import os
+import tempfile
+import threading
+
+try:
+    import duckdb
+except ImportError:  # DuckDB es opcional: sin él las páginas usan pandas
+    duckdb = None
+
+from utils.rutas import PARQUET_DIR
+
+# Recursos del motor por proceso: hilos para escaneos en paralelo y límite de
+# memoria a partir del cual los joins/agregaciones se vuelcan a disco. Por
+# defecto la CPU y el presupuesto de memoria se reparten entre los workers de
+# gunicorn (WEB_CONCURRENCY); ambos se pueden fijar por variable de entorno.
+_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+DUCKDB_MEMORY_TOTAL_MB = int(os.environ.get('DUCKDB_MEMORY_TOTAL_MB', 2048))
+DUCKDB_THREADS = int(os.environ.get('DUCKDB_THREADS', max(1, (os.cpu_count() or 1) // _WORKERS)))
+DUCKDB_MEMORY_LIMIT = os.environ.get('DUCKDB_MEMORY_LIMIT', f'{max(256, DUCKDB_MEMORY_TOTAL_MB // _WORKERS)}MB')
+DUCKDB_TEMP_DIR = os.path.join(tempfile.gettempdir(), 'dashalaves_duckdb')
+
+_conexion = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """Los procesos hijo no heredan la conexión: cada worker abre la suya"""
+    global _conexion, _lock
+    _conexion = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def is_available():
+    """Indica si DuckDB está instalado"""
+    return duckdb is not None
+
+
+def _quote_path(path):
+    return "'" + path.replace("'", "''") + "'"
+
+
+def register_views(conn, parquet_dir=PARQUET_DIR):
+    """
+    Crea una vista por cada archivo .parquet del directorio.
+
+    El nombre de la vista es el del archivo sin extensión (events_league_all,
+    matches_league_all, ...). Las vistas no materializan nada: cada consulta
+    lee sólo las columnas y row groups que necesita.
+    """
+    vistas = []
+    for nombre in sorted(os.listdir(parquet_dir)):
+        if not nombre.endswith('.parquet'):
+            continue
+        vista = os.path.splitext(nombre)[0]
+        ruta = os.path.join(parquet_dir, nombre)
+        conn.execute(f'CREATE OR REPLACE VIEW "{vista}" AS SELECT * FROM read_parquet({_quote_path(ruta)})')
+        vistas.append(vista)
+    return vistas
+
+
+def get_connection():
+    """
+    Devuelve un cursor de DuckDB para el hilo actual.
+
+    Hay una única base de datos en memoria compartida por todo el proceso;
+    cada llamada devuelve un cursor propio porque las conexiones de DuckDB no
+    deben compartirse entre hilos.
+    """
+    global _conexion
+    if duckdb is None:
+        raise RuntimeError("DuckDB no está instalado")
+    with _lock:
+        if _conexion is None:
+            os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+            conn = duckdb.connect(database=':memory:')
+            conn.execute(f"SET threads = {int(DUCKDB_THREADS)}")
+            conn.execute(f"SET memory_limit = {_quote_path(DUCKDB_MEMORY_LIMIT)}")
+            conn.execute(f"SET temp_directory = {_quote_path(DUCKDB_TEMP_DIR)}")
+            register_views(conn)
+            _conexion = conn
+    return _conexion.cursor()
+
+
+def close():
+    """Cierra la conexión compartida (p. ej. en el proceso maestro antes del fork)"""
+    global _conexion
+    with _lock:
+        if _conexion is not None:
+            _conexion.close()
+            _conexion = None
+
+
+def query(sql, params=None):
+    """
+    Ejecuta una consulta parametrizada y devuelve un DataFrame de pandas.
+
+    Los valores se pasan siempre como parámetros (?), nunca interpolados en
+    el SQL.
+    """
+    cursor = get_connection()
+    try:
+        return cursor.execute(sql, params or []).df()
+    finally:
+        cursor.close()
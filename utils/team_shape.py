@@ -0,0 +1,204 @@
+# Forma del equipo (envolvente convexa) por partido y fase de juego
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import ConvexHull, QhullError
+
+from utils.rutas import DERIVADOS_DIR, PARQUET_DIR
+
+EVENTOS_PATH = os.path.join(PARQUET_DIR, 'eventos_metricas_alaves.parquet')
+PARTIDOS_PATH = os.path.join(PARQUET_DIR, 'matches_league_all.parquet')
+FORMA_PATH = os.path.join(DERIVADOS_DIR, 'forma_equipo.parquet')
+
+COLUMNAS = ['event_id', 'match_id', 'season_id', 'temporada', 'equipo', 'tipo_evento', 'xstart', 'ystart']
+
+# Columnas candidatas para la fecha del partido en matches_league_all
+COLUMNAS_FECHA = ['match_date', 'date', 'fecha', 'start_time', 'kickoff']
+
+# Las coordenadas vienen en escala 0-100 (wyscout); se pasan a metros
+LARGO_CAMPO = 105.0
+ANCHO_CAMPO = 68.0
+
+# Tipos de evento que cuentan como fase defensiva (sin balón)
+EVENTOS_DEFENSIVOS = ['recuperaci', 'entrada', 'intercep', 'despeje', 'duelo', 'falta', 'bloqueo', 'presi']
+
+# Una envolvente con todas las acciones de un partido cubre casi todo el
+# campo, así que la forma se mide en ventanas de acciones consecutivas y se
+# resume con la mediana. En cada ventana se descartan las acciones más
+# alejadas del centro antes de calcular la envolvente.
+ACCIONES_VENTANA = 30
+CUANTIL_RECORTE = 0.9
+
+# Acciones mínimas para que la envolvente sea representativa
+MIN_ACCIONES = 5
+
+_FORMA = None
+
+
+def get_phase(tipo_evento):
+    """Clasifica un tipo de evento en fase 'Ataque' o 'Defensa'"""
+    texto = str(tipo_evento).lower()
+    if any(clave in texto for clave in EVENTOS_DEFENSIVOS):
+        return 'Defensa'
+    return 'Ataque'
+
+
+def compute_shape(x, y):
+    """
+    Calcula área, anchura, profundidad y centroide de un conjunto de acciones.
+
+    x e y en metros. El área es la de la envolvente convexa; anchura y
+    profundidad son la extensión en cada eje.
+    """
+    puntos = np.column_stack([x, y])
+    area = np.nan
+    if len(puntos) >= 3:
+        try:
+            # En 2D ConvexHull.volume es el área (area sería el perímetro)
+            area = ConvexHull(puntos).volume
+        except QhullError:
+            area = 0.0
+    return {
+        'area': area,
+        'anchura': float(np.ptp(y)) if len(y) else np.nan,
+        'profundidad': float(np.ptp(x)) if len(x) else np.nan,
+        'centroide_x': float(np.mean(x)) if len(x) else np.nan,
+        'centroide_y': float(np.mean(y)) if len(y) else np.nan,
+        'acciones': len(puntos),
+    }
+
+
+def _trim_outliers(x, y, cuantil=CUANTIL_RECORTE):
+    """Descarta las acciones más alejadas de la mediana de la ventana"""
+    distancia = np.hypot(x - np.median(x), y - np.median(y))
+    dentro = distancia <= np.quantile(distancia, cuantil)
+    return x[dentro], y[dentro]
+
+
+def compute_windowed_shape(x, y, ventana=ACCIONES_VENTANA):
+    """
+    Forma de un equipo en una fase de un partido.
+
+    x e y en orden cronológico. Se calcula la forma de cada ventana de
+    'ventana' acciones (con recorte de atípicos) y se devuelve la mediana de
+    área, anchura y profundidad; el centroide es el de todas las acciones.
+    """
+    formas = []
+    for inicio in range(0, len(x), ventana):
+        xv, yv = x[inicio:inicio + ventana], y[inicio:inicio + ventana]
+        if len(xv) < MIN_ACCIONES:
+            continue
+        formas.append(compute_shape(*_trim_outliers(xv, yv)))
+    if not formas:
+        return None
+
+    df_formas = pd.DataFrame(formas)
+    return {
+        'area': float(df_formas['area'].median()),
+        'anchura': float(df_formas['anchura'].median()),
+        'profundidad': float(df_formas['profundidad'].median()),
+        'centroide_x': float(np.mean(x)),
+        'centroide_y': float(np.mean(y)),
+        'acciones': len(x),
+        'ventanas': len(formas),
+    }
+
+
+def _shapes_for_match(df_partido):
+    """Formas de cada equipo y fase en un partido (se ejecuta en un proceso del pool)"""
+    filas = []
+    df_partido = df_partido.sort_values('event_id')
+    for equipo, df_equipo in df_partido.groupby('equipo', observed=True):
+        # 'Total' usa todas las acciones del equipo; no hace falta duplicar filas
+        grupos = [('Total', df_equipo)] + list(df_equipo.groupby('fase'))
+        for fase, grupo in grupos:
+            forma = compute_windowed_shape(grupo['x'].to_numpy(), grupo['y'].to_numpy())
+            if forma is None:
+                continue
+            forma.update({
+                'match_id': grupo['match_id'].iat[0],
+                'season_id': grupo['season_id'].iat[0],
+                'temporada': grupo['temporada'].iat[0],
+                'equipo': equipo,
+                'fase': fase,
+            })
+            filas.append(forma)
+    return filas
+
+
+def _match_dates(partidos_path=PARTIDOS_PATH):
+    """Fecha de cada partido según matches_league_all (vacío si no está disponible)"""
+    try:
+        df = pd.read_parquet(partidos_path)
+        col_fecha = next(col for col in COLUMNAS_FECHA if col in df.columns)
+    except Exception as e:
+        print(f"Sin fechas de partido ({partidos_path}): {e}")
+        return pd.DataFrame(columns=['match_id', 'fecha'])
+    df = df[['match_id', col_fecha]].rename(columns={col_fecha: 'fecha'})
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    return df.drop_duplicates('match_id')
+
+
+def build_team_shapes(eventos_path=EVENTOS_PATH, output_path=FORMA_PATH, max_workers=None,
+                      partidos_path=PARTIDOS_PATH):
+    """
+    Calcula la forma del equipo para todos los partidos y la guarda como tabla derivada.
+
+    Cada partido se procesa en un proceso del pool; además de las fases de
+    Ataque y Defensa se calcula una fase 'Total' con todas las acciones. Se
+    añade la fecha del partido para ordenar la evolución de la temporada.
+    """
+    df = pd.read_parquet(eventos_path, columns=COLUMNAS)
+    # Misma orientación que los mapas de pages/equipo.py: ystart es el largo
+    # del campo (x del Pitch) y xstart el ancho
+    df['x'] = pd.to_numeric(df['ystart'], errors='coerce') * LARGO_CAMPO / 100
+    df['y'] = pd.to_numeric(df['xstart'], errors='coerce') * ANCHO_CAMPO / 100
+    df = df.dropna(subset=['match_id', 'x', 'y']).drop(columns=['xstart', 'ystart'])
+
+    # Mapear sólo los tipos de evento distintos, no cada fila
+    fases = {tipo: get_phase(tipo) for tipo in df['tipo_evento'].unique()}
+    df['fase'] = df['tipo_evento'].map(fases)
+
+    partidos = [grupo for _, grupo in df.groupby('match_id', sort=False)]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        resultados = pool.map(_shapes_for_match, partidos, chunksize=8)
+        filas = [fila for filas_partido in resultados for fila in filas_partido]
+
+    df_forma = pd.DataFrame(filas)
+    if not df_forma.empty:
+        df_forma = df_forma.merge(_match_dates(partidos_path), on='match_id', how='left')
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df_forma.to_parquet(output_path, index=False)
+    return df_forma
+
+
+def load_team_shape_table(path=FORMA_PATH):
+    """Carga la tabla derivada en memoria (una vez por proceso)"""
+    global _FORMA
+    try:
+        _FORMA = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Error cargando forma del equipo {path}: {e}")
+        _FORMA = None
+    return _FORMA
+
+
+def load_team_shapes(team, season_ids=None, path=FORMA_PATH):
+    """Devuelve la forma por partido de un equipo leyendo la tabla derivada (cacheada en memoria)"""
+    if _FORMA is None and load_team_shape_table(path) is None:
+        return pd.DataFrame()
+
+    df = _FORMA[_FORMA['equipo'] == team]
+    if season_ids is not None:
+        df = df[df['season_id'].astype(str).isin([str(s) for s in season_ids])]
+    return df
+
+
+if __name__ == '__main__':
+    # Mismos argumentos que utils/ingest.py ([carpeta_parquet] [carpeta_derivados]);
+    # para reconstruir todo en orden: python -m utils.ingest
+    from utils import ingest
+    sys.exit(ingest.main(pasos=['forma']))
@@ -0,0 +1,75 @@
+"""
+Punto de entrada WSGI para producción.
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+Con preload_app (gunicorn.conf.py) este módulo se importa una sola vez en
+el proceso maestro: los datos de las páginas, los índices derivados y las
+imágenes de las combinaciones equipo/temporada más usadas quedan en memoria
+antes del fork y los workers los comparten copy-on-write.
+
+Las tablas derivadas y la caché de imágenes (equipo.render_team_figures) se
+cargan una sola vez y no se invalidan. Tras una ingesta hay que regenerar
+data/derivados en orden (percentiles -> similitud -> forma -> kpis) con
+
+    python -m utils.ingest
+
+y después reiniciar gunicorn para servir los datos nuevos.
+"""
+import gc
+import os
+import time
+
+from app import server
+from pages import equipo
+from utils import kpi_series, percentiles, similarity, sql_engine, team_shape
+
+# Número de combinaciones equipo/temporada que se renderizan en el arranque
+WARMUP_MAX = int(os.environ.get('WARMUP_MAX', 6))
+
+
+def preload():
+    """Carga los índices y tablas derivadas (los datos de las páginas ya se cargan al importarlas)"""
+    percentiles.load_percentile_index()
+    similarity.load_similarity_index()
+    team_shape.load_team_shape_table()
+    kpi_series.load_kpi_series_table()
+
+
+def warmup_combinations(max_combinaciones=WARMUP_MAX):
+    """
+    Combinaciones más usadas: primero las temporadas del equipo que la página
+    selecciona por defecto (el primero alfabéticamente, como en init_teams),
+    de la más reciente a la más antigua; después las de los demás equipos,
+    también de la más reciente a la más antigua.
+    """
+    if equipo.FILTER_DATA is None:
+        return []
+    df = equipo.FILTER_DATA[['equipo', 'temporada']].drop_duplicates()
+    por_defecto = str(sorted(df['equipo'].unique())[0])
+    df = df.astype(str).assign(_otro=lambda d: d['equipo'] != por_defecto)
+    df = df.sort_values(['_otro', 'temporada', 'equipo'], ascending=[True, False, True])
+    return list(df[['equipo', 'temporada']].itertuples(index=False, name=None))[:max_combinaciones]
+
+
+def warm_up(max_combinaciones=WARMUP_MAX):
+    """Prerenderiza las imágenes de la página de equipo para las combinaciones más usadas"""
+    for team, season in warmup_combinations(max_combinaciones):
+        inicio = time.perf_counter()
+        try:
+            equipo.render_team_figures(team, season)
+            print(f"Precalentado {team} {season} en {time.perf_counter() - inicio:.1f}s")
+        except Exception as e:
+            print(f"Error precalentando {team} {season}: {e}")
+
+
+preload()
+warm_up()
+
+# La conexión DuckDB no debe cruzar el fork; cada worker abre la suya
+sql_engine.close()
+
+# Sacar los objetos cargados del recolector para que no se toquen (y copien) en los workers
+gc.freeze()
+
+application = server